@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pricecomparison',
+            name='transaction',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_comparisons', to='core.transaction'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_pricecomparison_transaction'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['agent_instance', '-created_at'], name='tx_agent_created_desc_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:24
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_transaction_agent_created_desc_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agentinstance',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['allowed_merchants'], name='agent_allowed_merch_gin'),
+        ),
+    ]
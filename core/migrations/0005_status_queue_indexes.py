@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_agentinstance_allowed_merchants_gin'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agentinstance',
+            index=models.Index(fields=['status'], name='agent_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', 'created_at'], name='tx_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:26
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_savings_percentage(apps, schema_editor):
+    Transaction = apps.get_model('core', 'Transaction')
+    Transaction.objects.filter(
+        market_average_price__gt=0,
+        amount__gt=0
+    ).update(
+        savings_percentage=(F('market_average_price') - F('amount')) * 100 / F('market_average_price')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_status_queue_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='savings_percentage',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_savings_percentage, migrations.RunPython.noop),
+    ]
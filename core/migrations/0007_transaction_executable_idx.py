@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_transaction_savings_percentage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('executed_at__isnull', True), ('status', 'APPROVED')), fields=['created_at'], name='tx_executable_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_transaction_executable_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='agentinstance',
+            constraint=models.CheckConstraint(condition=models.Q(('bridge_wallet_address', ''), ('bridge_wallet_address__regex', '^0x[0-9a-fA-F]{40}$'), _connector='OR'), name='valid_eth_addr'),
+        ),
+    ]
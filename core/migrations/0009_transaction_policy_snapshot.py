@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_agentinstance_valid_eth_addr'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='snapshot_allowed_merchants',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='snapshot_max_budget',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:32
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+STATUS_CODES = {
+    'PENDING': 0,
+    'VERIFYING': 1,
+    'APPROVED': 2,
+    'EXECUTED': 3,
+    'REJECTED': 4,
+}
+
+
+def status_to_code(apps, schema_editor):
+    Transaction = apps.get_model('core', 'Transaction')
+    Transaction.objects.update(
+        status_code=Case(
+            *[When(status=name, then=Value(code)) for name, code in STATUS_CODES.items()],
+            default=Value(0),
+        )
+    )
+
+
+def code_to_status(apps, schema_editor):
+    Transaction = apps.get_model('core', 'Transaction')
+    Transaction.objects.update(
+        status=Case(
+            *[When(status_code=code, then=Value(name)) for name, code in STATUS_CODES.items()],
+            default=Value('PENDING'),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_transaction_policy_snapshot'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='core_transa_agent_i_1f7114_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='tx_status_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='tx_executable_idx',
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='status_code',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(status_to_code, code_to_status),
+        migrations.RemoveField(
+            model_name='transaction',
+            name='status',
+        ),
+        migrations.RenameField(
+            model_name='transaction',
+            old_name='status_code',
+            new_name='status',
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Verifying'), (2, 'Approved'), (3, 'Executed'), (4, 'Rejected')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['agent_instance', 'status'], name='core_transa_agent_i_1f7114_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', 'created_at'], name='tx_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('executed_at__isnull', True), ('status', 2)), fields=['created_at'], name='tx_executable_idx'),
+        ),
+    ]
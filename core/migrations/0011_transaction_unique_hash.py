@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-15 01:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_transaction_status_smallint'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('transaction_hash', ''), _negated=True), fields=('transaction_hash',), name='unique_transaction_hash'),
+        ),
+    ]
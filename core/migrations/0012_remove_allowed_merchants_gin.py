@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-15 02:04
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_transaction_unique_hash'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='agentinstance',
+            name='agent_allowed_merch_gin',
+        ),
+    ]
@@ -1,5 +1,10 @@
-from django.db import models
+import functools
+from django.db import models, transaction as db_transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 class AgentTemplate(models.Model):
@@ -11,6 +16,39 @@ class AgentTemplate(models.Model):
     class Meta:
         indexes = [models.Index(fields=['name'])]
 
+@functools.lru_cache(maxsize=1024)
+def get_template_cached(pk):
+    """
+    Process-local cache of templates; cleared whenever a template is saved or
+    deleted. Bulk writes (bulk_create, update()) send no signals, and a
+    rollback doesn't evict templates cached inside the rolled-back
+    transaction; code doing either must call get_template_cached.cache_clear()
+    """
+    return AgentTemplate.objects.get(pk=pk)
+
+@receiver([post_save, post_delete], sender=AgentTemplate)
+def _clear_template_cache(sender, **kwargs):
+    get_template_cached.cache_clear()
+
+class AgentInstanceQuerySet(models.QuerySet):
+    def with_status_payload(self):
+        """
+        Agents with just the status columns, plus their latest transaction's
+        fields as latest_tx_* annotations (correlated subqueries served by
+        tx_agent_created_desc_idx), so status reads never need a second query
+        """
+        # id breaks created_at ties, so every subquery picks the same row
+        latest = Transaction.objects.filter(
+            agent_instance=models.OuterRef('pk')
+        ).order_by('-created_at', '-id')
+        return self.only('id', 'status', 'trust_score').annotate(
+            latest_tx_id=models.Subquery(latest.values('id')[:1]),
+            latest_tx_status=models.Subquery(latest.values('status')[:1]),
+            latest_tx_amount=models.Subquery(latest.values('amount')[:1]),
+            latest_tx_merchant=models.Subquery(latest.values('merchant')[:1]),
+            latest_tx_created_at=models.Subquery(latest.values('created_at')[:1])
+        )
+
 class AgentInstance(models.Model):
     STATUS_CHOICES = [
         ('IDLE', 'Idle'),
@@ -31,32 +69,53 @@ class AgentInstance(models.Model):
     max_budget = models.DecimalField(max_digits=10, decimal_places=2)
     allowed_merchants = models.JSONField(default=list)
     bridge_wallet_address = models.CharField(max_length=255, blank=True)
+
+    objects = AgentInstanceQuerySet.as_manager()
     
     class Meta:
         indexes = [
             models.Index(fields=['user', 'status']),
-            models.Index(fields=['trust_score'])
+            models.Index(fields=['trust_score']),
+            # (user, status) can't serve status-only queue scans
+            models.Index(fields=['status'], name='agent_status_idx'),
         ]
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    Q(bridge_wallet_address='')
+                    | Q(bridge_wallet_address__regex=r'^0x[0-9a-fA-F]{40}$')
+                ),
+                name='valid_eth_addr'
+            )
+        ]
+
+class TransactionStatus(models.IntegerChoices):
+    """Stored as a smallint; the API exposes the member names ('APPROVED', ...)"""
+    PENDING = 0, 'Pending'
+    VERIFYING = 1, 'Verifying'
+    APPROVED = 2, 'Approved'
+    EXECUTED = 3, 'Executed'
+    REJECTED = 4, 'Rejected'
 
 class Transaction(models.Model):
-    STATUS_CHOICES = [
-        ('PENDING', 'Pending'),
-        ('VERIFYING', 'Verifying'),
-        ('APPROVED', 'Approved'),
-        ('EXECUTED', 'Executed'),
-        ('REJECTED', 'Rejected')
-    ]
+    Status = TransactionStatus
     
     agent_instance = models.ForeignKey(AgentInstance, on_delete=models.PROTECT)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     merchant = models.CharField(max_length=255)
     merchant_wallet = models.CharField(max_length=255)
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.PENDING)
     
     # Price comparison fields
     market_average_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
     lowest_price_found = models.DecimalField(max_digits=10, decimal_places=2, null=True)
     price_difference_percentage = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    # Derived from amount/market_average_price on save
+    savings_percentage = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+
+    # Agent policy captured at creation time
+    snapshot_max_budget = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    snapshot_allowed_merchants = models.JSONField(null=True)
     
     # Transaction details
     created_at = models.DateTimeField(auto_now_add=True)
@@ -66,11 +125,120 @@ class Transaction(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['agent_instance', 'status']),
-            models.Index(fields=['created_at'])
+            models.Index(fields=['created_at']),
+            models.Index(fields=['status', 'created_at'], name='tx_status_created_idx'),
+            # Serves "latest transaction for agent" lookups
+            models.Index(
+                fields=['agent_instance', '-created_at'],
+                name='tx_agent_created_desc_idx'
+            ),
+            # Partial index over the execution queue only; terminal rows stay out
+            models.Index(
+                fields=['created_at'],
+                name='tx_executable_idx',
+                condition=Q(status=TransactionStatus.APPROVED, executed_at__isnull=True)
+            )
+        ]
+        constraints = [
+            # A transfer hash may only be recorded once; unexecuted rows are blank
+            models.UniqueConstraint(
+                fields=['transaction_hash'],
+                condition=~Q(transaction_hash=''),
+                name='unique_transaction_hash'
+            )
         ]
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.snapshot_max_budget is None:
+            self.snapshot_agent_policy()
+        self.savings_percentage = self.compute_savings_percentage()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'amount', 'market_average_price'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'savings_percentage'}
+        super().save(*args, **kwargs)
+
+    def snapshot_agent_policy(self):
+        self.snapshot_max_budget = self.agent_instance.max_budget
+        self.snapshot_allowed_merchants = self.agent_instance.allowed_merchants
+
+    def compute_savings_percentage(self):
+        if self.market_average_price and self.amount:
+            savings = (self.market_average_price - self.amount) / self.market_average_price * 100
+            return round(savings, 2)
+        return None
+
+AGENT_STATUS_CACHE_TIMEOUT = 60 * 5
+LATEST_TRANSACTION_CACHE_TIMEOUT = 60 * 60
+# Bumped to drop every cached status at once (e.g. fleet-wide score updates)
+_AGENT_STATUS_GENERATION_KEY = 'agent-status:generation'
+
+def _agent_status_cache_key(agent_id, suffix=''):
+    generation = cache.get_or_set(_AGENT_STATUS_GENERATION_KEY, 1, timeout=None)
+    return f'agent-status:{generation}:{agent_id}{suffix}'
+
+def get_agent_status_cached(agent_id):
+    """Cached {'user_id': ..., 'payload': ...} for AgentStatusView, or None"""
+    return cache.get(_agent_status_cache_key(agent_id))
+
+def set_agent_status_cached(agent_id, user_id, payload):
+    cache.set(
+        _agent_status_cache_key(agent_id),
+        {'user_id': user_id, 'payload': payload},
+        timeout=AGENT_STATUS_CACHE_TIMEOUT
+    )
+
+def get_latest_transaction_cached(agent_id):
+    """Cached latest_transaction payload for AgentStatusView, or None"""
+    return cache.get(_agent_status_cache_key(agent_id, ':latest-tx'))
+
+def set_latest_transaction_cached(agent_id, payload):
+    cache.set(
+        _agent_status_cache_key(agent_id, ':latest-tx'),
+        payload,
+        timeout=LATEST_TRANSACTION_CACHE_TIMEOUT
+    )
+
+def invalidate_agent_status(agent_ids=None, latest_transaction=True):
+    """
+    Drop the cached status of the given agents, or of all agents if None
+    Inside a transaction the entries are dropped again on commit, since a
+    poll before then can re-cache the rows as they were before the change
+    """
+    if agent_ids is not None:
+        agent_ids = list(agent_ids)
+    _drop_agent_status(agent_ids, latest_transaction)
+    if db_transaction.get_connection().in_atomic_block:
+        db_transaction.on_commit(
+            functools.partial(_drop_agent_status, agent_ids, latest_transaction)
+        )
+
+def _drop_agent_status(agent_ids, latest_transaction):
+    if agent_ids is None:
+        try:
+            cache.incr(_AGENT_STATUS_GENERATION_KEY)
+        except ValueError:
+            pass  # no generation stored yet, so nothing is cached either
+        return
+    keys = [_agent_status_cache_key(agent_id) for agent_id in agent_ids]
+    if latest_transaction:
+        keys += [_agent_status_cache_key(agent_id, ':latest-tx') for agent_id in agent_ids]
+    cache.delete_many(keys)
+
+@receiver([post_save, post_delete], sender=AgentInstance)
+def _clear_agent_status(sender, instance, **kwargs):
+    # Agent changes don't affect which transaction is the latest
+    invalidate_agent_status([instance.pk], latest_transaction=False)
+
+@receiver([post_save, post_delete], sender=Transaction)
+def _clear_transaction_agent_status(sender, instance, **kwargs):
+    invalidate_agent_status([instance.agent_instance_id])
+
 class PriceComparison(models.Model):
-    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE)
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name='price_comparisons'
+    )
     merchant_name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     url = models.URLField()
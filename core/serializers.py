@@ -1,13 +1,41 @@
+import copy
+import re
+from concurrent.futures import ThreadPoolExecutor
 from rest_framework import serializers
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from .models import AgentTemplate, AgentInstance, Transaction, PriceComparison
+from django.db import transaction
+from .models import AgentTemplate, AgentInstance, Transaction, PriceComparison, get_template_cached
 
-class UserSerializer(serializers.ModelSerializer):
+# Matches the valid_eth_addr check constraint on AgentInstance; always used
+# with fullmatch, since '$' would also accept a trailing newline
+_ETH_ADDR = re.compile(r'0x[0-9a-fA-F]{40}')
+
+class CachedFieldsMixin:
+    """
+    Build the ModelSerializer field map once per class; each instance gets
+    a deep copy (what DRF already does for declared fields) instead of
+    re-introspecting the model
+    """
+    _fields_cache = None
+
+    def get_fields(self):
+        cls = type(self)
+        if cls.__dict__.get('_fields_cache') is None:
+            cls._fields_cache = super().get_fields()
+        return copy.deepcopy(cls._fields_cache)
+
+class UserListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        return self.child.create_many(validated_data)
+
+class UserSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'password')
+        list_serializer_class = UserListSerializer
     
     def create(self, validated_data):
         user = User.objects.create_user(
@@ -17,14 +45,35 @@ class UserSerializer(serializers.ModelSerializer):
         )
         return user
 
+    def create_many(self, validated_list):
+        """
+        Batch signup: hash passwords in parallel (hashlib releases the GIL)
+        and insert all users in one bulk_create
+        """
+        with ThreadPoolExecutor() as executor:
+            hashes = list(executor.map(
+                make_password, [data['password'] for data in validated_list]
+            ))
+
+        users = [
+            User(
+                username=User.normalize_username(data['username']),
+                email=User.objects.normalize_email(data['email']),
+                password=password_hash
+            )
+            for data, password_hash in zip(validated_list, hashes)
+        ]
+        with transaction.atomic():
+            return User.objects.bulk_create(users, batch_size=500)
+
 class AgentTemplateSerializer(serializers.ModelSerializer):
     class Meta:
         model = AgentTemplate
         fields = '__all__'
 
-class AgentInstanceSerializer(serializers.ModelSerializer):
+class AgentInstanceSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    template = AgentTemplateSerializer(read_only=True)
+    template = serializers.SerializerMethodField()
     template_id = serializers.PrimaryKeyRelatedField(
         queryset=AgentTemplate.objects.all(),
         write_only=True,
@@ -40,6 +89,10 @@ class AgentInstanceSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('status', 'trust_score')
     
+    def get_template(self, obj):
+        # Templates are a small read-mostly catalog; skip the JOIN/lookup
+        return AgentTemplateSerializer(get_template_cached(obj.template_id)).data
+
     def validate_constraints(self, value):
         if not isinstance(value, dict):
             raise serializers.ValidationError("Constraints must be a dictionary")
@@ -56,15 +109,42 @@ class AgentInstanceSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Max budget must be greater than 0")
         return value
 
+    def validate_bridge_wallet_address(self, value):
+        if value and not _ETH_ADDR.fullmatch(value):
+            raise serializers.ValidationError(
+                "Invalid Ethereum wallet address format"
+            )
+        return value
+
+class AgentSummarySerializer(serializers.ModelSerializer):
+    """Lightweight serializer for agent listings"""
+    username = serializers.CharField(source='user.username', read_only=True)
+    template_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AgentInstance
+        fields = ('id', 'status', 'trust_score', 'max_budget', 'username', 'template_name')
+
+    def get_template_name(self, obj):
+        return get_template_cached(obj.template_id).name
+
 class PriceComparisonSerializer(serializers.ModelSerializer):
     class Meta:
         model = PriceComparison
         fields = ('merchant_name', 'price', 'url', 'timestamp')
         read_only_fields = ('timestamp',)
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(CachedFieldsMixin, serializers.ModelSerializer):
+    # Only what validation, the policy snapshot and the transfer read;
+    # the constraints JSON is never loaded
+    agent_instance = serializers.PrimaryKeyRelatedField(
+        queryset=AgentInstance.objects.only(
+            'id', 'user_id', 'max_budget', 'allowed_merchants', 'bridge_wallet_address'
+        )
+    )
     price_comparisons = PriceComparisonSerializer(many=True, read_only=True)
     savings_percentage = serializers.SerializerMethodField()
+    status = serializers.SerializerMethodField()
     
     class Meta:
         model = Transaction
@@ -81,11 +161,19 @@ class TransactionSerializer(serializers.ModelSerializer):
             'transaction_hash'
         )
     
+    def get_status(self, obj):
+        return Transaction.Status(obj.status).name
+
     def get_savings_percentage(self, obj):
-        if obj.market_average_price and obj.amount:
-            savings = (obj.market_average_price - obj.amount) / obj.market_average_price * 100
-            return round(savings, 2)
-        return None
+        # Persisted by Transaction.save()
+        return obj.savings_percentage
+
+    def validate_merchant_wallet(self, value):
+        if not _ETH_ADDR.fullmatch(value):
+            raise serializers.ValidationError(
+                "Invalid Ethereum wallet address format"
+            )
+        return value
     
     def validate(self, data):
         # Verify amount is within agent's max budget
@@ -121,8 +209,7 @@ class AgentSetupSerializer(serializers.ModelSerializer):
         )
         
     def validate_bridge_wallet_address(self, value):
-        # Basic Ethereum address validation
-        if not value.startswith('0x') or len(value) != 42:
+        if not _ETH_ADDR.fullmatch(value):
             raise serializers.ValidationError(
                 "Invalid Ethereum wallet address format"
             )
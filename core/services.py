@@ -1,13 +1,72 @@
+import functools
+import hashlib
 import logging
+import re
+from collections import Counter
 from decimal import Decimal
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple, Union
 from django.conf import settings
-from .models import AgentInstance, Transaction
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from django.db.models import Case, When, Value, F, QuerySet
+from django.db.models.functions import Greatest, Least
+from .models import AgentInstance, Transaction, invalidate_agent_status
 from openai import OpenAI
 import json
+import textwrap
+from types import SimpleNamespace
 
 logger = logging.getLogger(__name__)
 
+# Constant and always sent first, so repeated calls share an identical prefix
+_SYSTEM_PROMPT = textwrap.dedent("""
+    You are a shopping assistant that converts user requirements into structured JSON.
+    Convert the shopping request into this exact format:
+    {
+        "max_price": <integer in USD>,
+        "categories": [<list of relevant product categories>],
+        "preferences": {
+            "brand": <"trusted", "any", or specific brand>,
+            "condition": <"new", "used", "any">,
+            "shipping": <"fast", "standard", "any">
+        }
+    }
+""").strip()
+
+# Punctuation that doesn't change a prompt's meaning; decimal points are kept
+_PROMPT_PUNCTUATION = re.compile(r'[^\w\s.]|\.(?!\d)')
+
+@functools.lru_cache(maxsize=4)
+def _get_openai_client(api_key: str, timeout: float, max_retries: int) -> OpenAI:
+    """
+    Returns a shared OpenAI client per configuration, so its HTTP connection
+    pool (and TLS sessions) are reused across requests
+    """
+    return OpenAI(api_key=api_key, timeout=timeout, max_retries=max_retries)
+
+class MockOpenAIClient:
+    """
+    Stand-in for the OpenAI client in tests (or with MOCK_OPENAI=1): answers
+    every chat completion with the same constraints, never touching the network
+    """
+    CONSTRAINTS = {
+        'max_price': 1000,
+        'categories': ['general'],
+        'preferences': {
+            'brand': 'any',
+            'condition': 'new',
+            'shipping': 'standard'
+        }
+    }
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        message = SimpleNamespace(content=json.dumps(self.CONSTRAINTS))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
 class ShoppingService:
     """
     Handles shopping task management and verification logic
@@ -19,42 +78,64 @@ class ShoppingService:
         Returns: task_id (str)
         """
         try:
-            # Update agent status to match STATUS_CHOICES
-            agent.status = 'SHOPPING'
-            agent.save()
+            # Update agent status to match STATUS_CHOICES, unless it was
+            # already claimed with claim_idle_agent
+            if agent.status != 'SHOPPING':
+                agent.status = 'SHOPPING'
+                agent.save(update_fields=['status'])
             
             # For demo purposes, generate a simple task ID
-            task_id = f"task_{agent.id}_{agent.user.id}"
+            task_id = f"task_{agent.id}_{agent.user_id}"
             
             logger.info(f"Started shopping task {task_id} for agent {agent.id}")
             return task_id
             
         except Exception as e:
             agent.status = 'ERROR'
-            agent.save()
+            agent.save(update_fields=['status'])
             logger.error(f"Failed to start shopping task: {str(e)}")
             raise
 
-    def verify_transaction(self, transaction: Transaction) -> Dict[str, Any]:
+    def claim_idle_agent(self, agent_id: int, user_id: int) -> bool:
+        """
+        Moves an owned IDLE agent to SHOPPING in one conditional UPDATE,
+        so concurrent requests can't both start a task
+        Returns: False if the agent is missing, not owned, or busy
+        """
+        claimed = AgentInstance.objects.filter(
+            id=agent_id,
+            user_id=user_id,
+            status='IDLE'
+        ).update(status='SHOPPING')
+        if claimed:
+            invalidate_agent_status([agent_id])
+        return bool(claimed)
+
+    def verify_transaction(self, transaction: Transaction, commit: bool = True) -> Dict[str, Any]:
         """
         Verifies transaction safety and compliance
+        With commit=False the status is set but left for the caller to save
         Returns: Dict with approval status and reason
         """
         try:
-            agent = transaction.agent_instance
-            
+            if transaction.snapshot_max_budget is None:
+                # Rows written before policy snapshots existed
+                transaction.snapshot_agent_policy()
+
             # Demo verification checks
             checks = {
-                'budget_check': transaction.amount <= agent.max_budget,
-                'merchant_check': transaction.merchant in agent.allowed_merchants,
+                'budget_check': transaction.amount <= transaction.snapshot_max_budget,
+                'merchant_check': transaction.merchant in transaction.snapshot_allowed_merchants,
                 'price_check': self._verify_price_reasonable(transaction)
             }
             
             approved = all(checks.values())
             
-            # Update transaction status based on model's STATUS_CHOICES
-            transaction.status = 'APPROVED' if approved else 'REJECTED'
-            transaction.save()
+            transaction.status = (
+                Transaction.Status.APPROVED if approved else Transaction.Status.REJECTED
+            )
+            if commit:
+                transaction.save()
             
             reason = None if approved else f"Failed checks: {[k for k,v in checks.items() if not v]}"
             
@@ -70,14 +151,119 @@ class ShoppingService:
                 'reason': f"Verification error: {str(e)}"
             }
 
-    def _verify_price_reasonable(self, transaction: Transaction) -> bool:
-        """Demo price verification"""
-        if transaction.market_average_price:
-            price_diff_percent = (
-                (transaction.amount - transaction.market_average_price) 
-                / transaction.market_average_price * 100
+    def verify_batch(self, transaction_ids: List[int]) -> Dict[int, bool]:
+        """
+        Verifies a batch of transactions with one read and one UPDATE
+        Only PENDING transactions are considered: VERIFYING rows belong to
+        in-flight verification requests, and ids that were already decided
+        are left alone. Either kind is missing from the result
+        Returns: Dict mapping transaction id to approval
+        """
+        undecided = Transaction.objects.filter(status=Transaction.Status.PENDING)
+        transactions = undecided.filter(id__in=transaction_ids).only(
+            'id', 'amount', 'merchant', 'market_average_price', 'agent_instance',
+            'snapshot_max_budget', 'snapshot_allowed_merchants'
+        )
+
+        results = {}
+        for tx in transactions:
+            if tx.snapshot_max_budget is None:
+                tx.snapshot_agent_policy()
+            results[tx.id] = (
+                tx.amount <= tx.snapshot_max_budget
+                and tx.merchant in tx.snapshot_allowed_merchants
+                and self._verify_price_reasonable(tx)
+            )
+
+        if results:
+            approved_ids = [tx_id for tx_id, approved in results.items() if approved]
+            # Re-checks the status, so a row decided since the read isn't flipped
+            undecided.filter(id__in=list(results)).update(
+                status=Case(
+                    When(id__in=approved_ids, then=Value(Transaction.Status.APPROVED)),
+                    default=Value(Transaction.Status.REJECTED)
+                )
+            )
+            invalidate_agent_status({tx.agent_instance_id for tx in transactions})
+
+        logger.info(
+            f"Verified batch of {len(results)} transactions "
+            f"({sum(results.values())} approved)"
+        )
+        return results
+
+    def get_executable_transactions(self, limit: int = 100):
+        """
+        Approved transactions still waiting to be executed, oldest first
+        Served by the partial tx_executable_idx index
+        """
+        return Transaction.objects.filter(
+            status=Transaction.Status.APPROVED,
+            executed_at__isnull=True
+        ).order_by('created_at')[:limit]
+
+    def execute_approved_transactions(self, wallet_service: 'MockBridgeWalletService',
+                                      limit: int = 100) -> int:
+        """
+        Executes the oldest approved transactions with one batched transfer
+        call and records the results with one bulk UPDATE
+        The batch is claimed first by stamping executed_at (concurrent runners
+        skip locked rows and no longer see claimed ones), so the transfer runs
+        outside any DB transaction and no transaction is ever paid twice.
+        APPROVED rows with executed_at set but no hash were claimed by a run
+        that died mid-transfer
+        Returns: number of transactions executed
+        """
+        claimed_at = timezone.now()
+        with db_transaction.atomic():
+            transactions = list(
+                Transaction.objects.filter(
+                    status=Transaction.Status.APPROVED,
+                    executed_at__isnull=True
+                ).select_for_update(skip_locked=True, of=('self',)).select_related(
+                    'agent_instance'
+                ).only(
+                    'id', 'amount', 'merchant_wallet', 'agent_instance__bridge_wallet_address'
+                ).order_by('created_at')[:limit]
+            )
+            if not transactions:
+                return 0
+            claimed = Transaction.objects.filter(pk__in=[tx.pk for tx in transactions])
+            claimed.update(executed_at=claimed_at)
+
+        try:
+            tx_hashes = wallet_service.execute_transfers([
+                (tx.agent_instance.bridge_wallet_address, tx.merchant_wallet, tx.amount, tx.pk)
+                for tx in transactions
+            ])
+        except Exception:
+            # Transfers are keyed by transaction, so the next run may retry them
+            claimed.update(executed_at=None)
+            raise
+
+        for tx, tx_hash in zip(transactions, tx_hashes):
+            tx.status = Transaction.Status.EXECUTED
+            tx.transaction_hash = tx_hash
+            tx.executed_at = claimed_at
+        executions = Counter(tx.agent_instance_id for tx in transactions)
+        with db_transaction.atomic():
+            Transaction.objects.bulk_update(
+                transactions, ['status', 'transaction_hash', 'executed_at']
             )
-            return abs(price_diff_percent) <= 15
+            # Same score event as the interactive path, once per transaction
+            TrustScoreService().update_scores_by_count(executions, 'SUCCESSFUL_TRANSACTION')
+
+        logger.info(f"Executed batch of {len(transactions)} transactions")
+        return len(transactions)
+
+    def _verify_price_reasonable(self, transaction: Transaction) -> bool:
+        """
+        Demo price verification: within 15% of the market average
+        Cross-multiplied (|a - m| * 100 <= 15 * |m|) to avoid Decimal division
+        """
+        market_price = transaction.market_average_price
+        if market_price:
+            return abs(transaction.amount - market_price) * 100 <= 15 * abs(market_price)
         return True
 
 class MockBridgeWalletService:  # Renamed from BridgeWalletService
@@ -92,48 +278,121 @@ class MockBridgeWalletService:  # Renamed from BridgeWalletService
         return mock_address
 
     def execute_transfer(self, from_wallet: str, to_wallet: str, 
-                        amount: Decimal) -> str:
-        """Mock USDC transfer"""
+                        amount: Decimal, reference=None) -> str:
+        """Mock USDC transfer; `reference` acts as the idempotency key"""
         # In production, this would call Bridge API
-        mock_tx_hash = f"0x{hash(f'{from_wallet}{to_wallet}{amount}'):064x}"
+        digest = hashlib.sha256(f'{from_wallet}{to_wallet}{amount}{reference}'.encode()).hexdigest()
+        mock_tx_hash = f"0x{digest}"
         logger.info(f"Mock transfer: {amount} USDC from {from_wallet} to {to_wallet}")
         return mock_tx_hash
 
+    def execute_transfers(self, transfers: List[Tuple[str, str, Decimal, Any]]) -> List[str]:
+        """
+        Mock batched USDC transfer of (from_wallet, to_wallet, amount, reference)
+        tuples; one Bridge call (and signature) for the whole batch
+        Returns: tx hashes in input order
+        """
+        # In production, this would call Bridge's batch endpoint
+        tx_hashes = [
+            "0x" + hashlib.sha256(f'{from_wallet}{to_wallet}{amount}{reference}'.encode()).hexdigest()
+            for from_wallet, to_wallet, amount, reference in transfers
+        ]
+        logger.info(f"Mock batch transfer: {len(tx_hashes)} USDC transfers")
+        return tx_hashes
+
 class TrustScoreService:
     """
     Handles trust score calculations and updates
     """
+    SCORE_IMPACTS = {
+        'SUCCESSFUL_TRANSACTION': 5,
+        'FAILED_TRANSACTION': -10,
+        'PRICE_SAVING': 2,
+        'SUSPICIOUS_ACTIVITY': -15
+    }
+
     def update_score(self, agent: AgentInstance, event_type: str) -> None:
         """
         Updates agent trust score based on events
+        The in-memory agent.trust_score is not refreshed
         """
-        score_impacts = {
-            'SUCCESSFUL_TRANSACTION': 5,
-            'FAILED_TRANSACTION': -10,
-            'PRICE_SAVING': 2,
-            'SUSPICIOUS_ACTIVITY': -15
-        }
-        
-        if event_type in score_impacts:
-            impact = score_impacts[event_type]
-            # Use validators from model
-            new_score = max(0, min(100, agent.trust_score + impact))
-            
-            agent.trust_score = new_score
-            agent.save()
-            
-            logger.info(
-                f"Updated trust score for agent {agent.id}: {new_score} "
-                f"(impact: {impact})"
-            )
+        self.update_scores([agent.pk], event_type)
+
+    def update_scores(self, agent_ids: Union[List[int], QuerySet], event_type: str) -> None:
+        """
+        Applies an event to many agents in a single atomic UPDATE,
+        clamped to the model's 0-100 range in the database
+        agent_ids may be an AgentInstance queryset; it is applied as a
+        subquery, so fleet-wide jobs never load agent rows into memory
+        """
+        impact = self.SCORE_IMPACTS.get(event_type)
+        if impact is None:
+            return
+
+        updated = AgentInstance.objects.filter(pk__in=agent_ids).update(
+            trust_score=Least(Value(100), Greatest(Value(0), F('trust_score') + impact))
+        )
+        # A queryset's ids aren't known without another read; drop all statuses
+        invalidate_agent_status(None if isinstance(agent_ids, QuerySet) else agent_ids)
+
+        logger.info(
+            f"Updated trust score for {updated} agent(s) "
+            f"(impact: {impact})"
+        )
+
+    def update_scores_by_count(self, event_counts: Dict[int, int], event_type: str) -> None:
+        """
+        Applies an event `count` times to each agent in one UPDATE
+        The deltas for one event share a sign, so clamping the summed delta
+        gives the same score as clamping after every event
+        """
+        impact = self.SCORE_IMPACTS.get(event_type)
+        if impact is None or not event_counts:
+            return
+
+        delta = Case(*[
+            When(pk=agent_id, then=Value(impact * count))
+            for agent_id, count in event_counts.items()
+        ])
+        updated = AgentInstance.objects.filter(pk__in=list(event_counts)).update(
+            trust_score=Least(Value(100), Greatest(Value(0), F('trust_score') + delta))
+        )
+        invalidate_agent_status(list(event_counts))
+
+        logger.info(
+            f"Updated trust score for {updated} agent(s) "
+            f"(impact: {impact} per event)"
+        )
 
 class PromptProcessingService:
+    CACHE_TIMEOUT = 60 * 60 * 24
+    # Short negative cache so an OpenAI outage isn't hammered per request
+    DEFAULT_CACHE_TIMEOUT = 60
+    # What AgentSetupView and AgentInstanceSerializer rely on
+    REQUIRED_KEYS = {'max_price', 'categories', 'preferences'}
+
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_SETTINGS['API_KEY'])
+        openai_settings = settings.OPENAI_SETTINGS
+        testing = getattr(settings, 'TESTING', False)
+        if openai_settings.get('MOCK') or (testing and openai_settings.get('MOCK_IN_TESTS')):
+            self.client = MockOpenAIClient()
+        else:
+            self.client = _get_openai_client(
+                openai_settings['API_KEY'],
+                openai_settings.get('TIMEOUT', 10.0),
+                openai_settings.get('MAX_RETRIES', 1)
+            )
         self.logger = logging.getLogger(__name__)
 
     def process_shopping_prompt(self, prompt: str) -> Dict[str, Any]:
         """Convert natural language prompt into structured shopping constraints."""
+        cache_key = self._get_cache_key(prompt)
+        cached_constraints = cache.get(cache_key)
+        if cached_constraints is not None:
+            self.logger.info(f"Using cached constraints for prompt: '{prompt}'")
+            # Cached fallbacks keep their 'default' provenance
+            return {'_source': 'cache', **cached_constraints}
+
         try:
             self.logger.info(f"Processing shopping prompt: '{prompt}'")
             
@@ -143,11 +402,18 @@ class PromptProcessingService:
                     {"role": "system", "content": self._get_system_prompt()},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.7
+                # Deterministic output for a fixed schema; the constraint JSON
+                # is ~100 tokens, so cap generation to bound worst-case latency
+                temperature=0,
+                max_tokens=500
             )
             
             constraints = json.loads(response.choices[0].message.content)
+            # Valid JSON of the wrong shape must not be cached or reach the views
+            if not isinstance(constraints, dict) or not self.REQUIRED_KEYS <= constraints.keys():
+                raise ValueError(f"Unexpected constraints shape: {constraints!r}")
             self.logger.info(f"Successfully generated constraints from OpenAI: {json.dumps(constraints, indent=2)}")
+            cache.set(cache_key, constraints, timeout=self.CACHE_TIMEOUT)
             return constraints
             
         except Exception as e:
@@ -155,8 +421,14 @@ class PromptProcessingService:
             self.logger.warning("⚠️ Using default constraints due to OpenAI error")
             default_constraints = self._get_default_constraints()
             self.logger.info(f"Default constraints being used: {json.dumps(default_constraints, indent=2)}")
+            cache.set(cache_key, default_constraints, timeout=self.DEFAULT_CACHE_TIMEOUT)
             return default_constraints
 
+    def _get_cache_key(self, prompt: str) -> str:
+        """Cache key for a prompt, insensitive to case, spacing and punctuation."""
+        normalized = ' '.join(_PROMPT_PUNCTUATION.sub('', prompt.lower()).split())
+        return 'prompt:' + hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
     def _get_default_constraints(self) -> Dict[str, Any]:
         """Get default constraints when OpenAI processing fails."""
         return {
@@ -172,16 +444,4 @@ class PromptProcessingService:
 
     def _get_system_prompt(self) -> str:
         """Define the system prompt for constraint generation."""
-        return """
-        You are a shopping assistant that converts user requirements into structured JSON.
-        Convert the shopping request into this exact format:
-        {
-            "max_price": <integer in USD>,
-            "categories": [<list of relevant product categories>],
-            "preferences": {
-                "brand": <"trusted", "any", or specific brand>,
-                "condition": <"new", "used", "any">,
-                "shipping": <"fast", "standard", "any">
-            }
-        }
-        """
\ No newline at end of file
+        return _SYSTEM_PROMPT
\ No newline at end of file
@@ -1,17 +1,14 @@
+from django.db import IntegrityError
 from django.test import TestCase
-from django.contrib.auth.models import User
 from decimal import Decimal
-from core.models import AgentTemplate, AgentInstance
+from core.models import AgentTemplate, AgentInstance, Transaction
+from .utils import create_users
 
 
 class AgentInstanceCreationTest(TestCase):
     def setUp(self):
         # Create test user
-        self.user = User.objects.create_user(
-            username='testuser',
-            email='test@example.com',
-            password='testpass123'
-        )
+        self.user = create_users('testuser')[0]
         
         # Create test template
         self.template = AgentTemplate.objects.create(
@@ -50,6 +47,16 @@ class AgentInstanceCreationTest(TestCase):
             self.fail(f"Failed to create agent instance: {str(e)}")
 
 
+    def test_invalid_wallet_address_rejected(self):
+        with self.assertRaises(IntegrityError):
+            AgentInstance.objects.create(
+                user=self.user,
+                template=self.template,
+                max_budget=Decimal('1000.00'),
+                bridge_wallet_address='0xnot-a-wallet'
+            )
+
+
 class AgentTemplateTest(TestCase):
     def test_create_template(self):
         template = AgentTemplate.objects.create(
@@ -60,3 +67,101 @@ class AgentTemplateTest(TestCase):
         
         self.assertEqual(template.name, 'Test Template')
         self.assertTrue('test' in template.capabilities)
+
+
+class TransactionSavingsTest(TestCase):
+    def setUp(self):
+        self.user = create_users('testuser')[0]
+        self.template = AgentTemplate.objects.create(
+            name='Test Template',
+            description='Test Description',
+            capabilities={'test': True}
+        )
+        self.agent = AgentInstance.objects.create(
+            user=self.user,
+            template=self.template,
+            max_budget=Decimal('1000.00'),
+            allowed_merchants=['Amazon']
+        )
+
+    def test_savings_percentage_persisted_on_save(self):
+        transaction = Transaction.objects.create(
+            agent_instance=self.agent,
+            amount=Decimal('150.00'),
+            merchant='Amazon',
+            merchant_wallet='0x1234567890abcdef1234567890abcdef12345678',
+            market_average_price=Decimal('200.00')
+        )
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.savings_percentage, Decimal('25.00'))
+
+        transaction.amount = Decimal('180.00')
+        transaction.save(update_fields=['amount'])
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.savings_percentage, Decimal('10.00'))
+
+    def test_savings_percentage_without_market_price(self):
+        transaction = Transaction.objects.create(
+            agent_instance=self.agent,
+            amount=Decimal('150.00'),
+            merchant='Amazon',
+            merchant_wallet='0x1234567890abcdef1234567890abcdef12345678'
+        )
+        transaction.refresh_from_db()
+        self.assertIsNone(transaction.savings_percentage)
+
+    def test_transaction_hash_unique_once_set(self):
+        wallet = '0x1234567890abcdef1234567890abcdef12345678'
+        for _ in range(2):
+            Transaction.objects.create(
+                agent_instance=self.agent,
+                amount=Decimal('150.00'),
+                merchant='Amazon',
+                merchant_wallet=wallet
+            )
+        Transaction.objects.create(
+            agent_instance=self.agent,
+            amount=Decimal('150.00'),
+            merchant='Amazon',
+            merchant_wallet=wallet,
+            transaction_hash='0xabc'
+        )
+        with self.assertRaises(IntegrityError):
+            Transaction.objects.create(
+                agent_instance=self.agent,
+                amount=Decimal('150.00'),
+                merchant='Amazon',
+                merchant_wallet=wallet,
+                transaction_hash='0xabc'
+            )
+
+    def test_with_status_payload_annotates_latest_transaction(self):
+        agent = AgentInstance.objects.with_status_payload().get(pk=self.agent.pk)
+        self.assertIsNone(agent.latest_tx_id)
+
+        for merchant in ('Amazon', 'BestBuy'):
+            latest = Transaction.objects.create(
+                agent_instance=self.agent,
+                amount=Decimal('150.00'),
+                merchant=merchant,
+                merchant_wallet='0x1234567890abcdef1234567890abcdef12345678'
+            )
+        with self.assertNumQueries(1):
+            agent = AgentInstance.objects.with_status_payload().get(pk=self.agent.pk)
+            self.assertEqual(agent.latest_tx_id, latest.id)
+            self.assertEqual(agent.latest_tx_merchant, 'BestBuy')
+            self.assertEqual(agent.status, 'IDLE')
+
+    def test_with_status_payload_breaks_created_at_ties_by_id(self):
+        for merchant in ('Amazon', 'BestBuy'):
+            latest = Transaction.objects.create(
+                agent_instance=self.agent,
+                amount=Decimal('150.00'),
+                merchant=merchant,
+                merchant_wallet='0x1234567890abcdef1234567890abcdef12345678'
+            )
+        Transaction.objects.filter(agent_instance=self.agent).update(created_at=latest.created_at)
+
+        agent = AgentInstance.objects.with_status_payload().get(pk=self.agent.pk)
+        self.assertEqual(agent.latest_tx_id, latest.id)
+        self.assertEqual(agent.latest_tx_merchant, 'BestBuy')
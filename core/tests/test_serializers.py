@@ -0,0 +1,62 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from unittest.mock import patch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from ..serializers import UserSerializer, AgentSetupSerializer, TransactionSerializer
+
+
+class UserSerializerTests(TestCase):
+    def test_batch_signup(self):
+        serializer = UserSerializer(data=[
+            {'username': 'user1', 'email': 'user1@example.com', 'password': 'testpass123'},
+            {'username': 'user2', 'email': 'user2@EXAMPLE.com', 'password': 'otherpass456'},
+        ], many=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        with self.assertNumQueries(3):  # savepoint, INSERT, release
+            users = serializer.save()
+
+        self.assertEqual(len(users), 2)
+        self.assertEqual(User.objects.count(), 2)
+        user2 = User.objects.get(username='user2')
+        self.assertEqual(user2.email, 'user2@example.com')
+        self.assertTrue(user2.check_password('otherpass456'))
+        self.assertNotIn('password', serializer.data[0])
+
+    def test_field_map_is_built_once(self):
+        build = patch.object(
+            serializers.ModelSerializer, 'get_fields',
+            autospec=True, side_effect=serializers.ModelSerializer.get_fields
+        )
+        with patch.object(UserSerializer, '_fields_cache', None), build as get_fields:
+            first = UserSerializer().fields
+            second = UserSerializer().fields
+
+        get_fields.assert_called_once()
+        self.assertEqual(list(first), list(second))
+        self.assertIsNot(first['username'], second['username'])
+        self.assertIs(second['username'].parent, second['username'].root)
+
+
+class AgentSetupSerializerTests(TestCase):
+    def test_validate_bridge_wallet_address(self):
+        serializer = AgentSetupSerializer()
+        valid = '0x1234567890abcdef1234567890abcdef12345678'
+        self.assertEqual(serializer.validate_bridge_wallet_address(valid), valid)
+
+        for invalid in ('0x1234', '0xZZ34567890abcdef1234567890abcdef12345678',
+                        valid[2:] + '00', valid + '\n'):
+            with self.assertRaises(ValidationError):
+                serializer.validate_bridge_wallet_address(invalid)
+
+
+class TransactionSerializerTests(TestCase):
+    def test_validate_merchant_wallet(self):
+        serializer = TransactionSerializer()
+        valid = '0x1234567890abcdef1234567890abcdef12345678'
+        self.assertEqual(serializer.validate_merchant_wallet(valid), valid)
+
+        for invalid in ('merchant-wallet', valid + '\n'):
+            with self.assertRaises(ValidationError):
+                serializer.validate_merchant_wallet(invalid)
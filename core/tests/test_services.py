@@ -1,25 +1,26 @@
 from django.test import TestCase
-from django.contrib.auth.models import User
+from django.core.cache import cache
 from decimal import Decimal
 from ..models import AgentTemplate, AgentInstance, Transaction
-from ..services import ShoppingService, MockBridgeWalletService, TrustScoreService, PromptProcessingService
-from unittest.mock import patch, MagicMock
+from .utils import create_users
+from ..services import (
+    ShoppingService, MockBridgeWalletService, TrustScoreService,
+    PromptProcessingService, MockOpenAIClient
+)
+from types import SimpleNamespace
 
 class ShoppingServiceTests(TestCase):
-    def setUp(self):
-        self.user = User.objects.create_user(
-            username='testuser',
-            email='test@example.com',
-            password='testpass123'
-        )
-        self.template = AgentTemplate.objects.create(
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_users('testuser')[0]
+        cls.template = AgentTemplate.objects.create(
             name='Test Template',
             description='Test Description',
             capabilities={'test': True}
         )
-        self.agent = AgentInstance.objects.create(
-            user=self.user,
-            template=self.template,
+        cls.agent = AgentInstance.objects.create(
+            user=cls.user,
+            template=cls.template,
             max_budget=Decimal('1000.00'),
             constraints={
                 'max_price': 500,
@@ -28,6 +29,8 @@ class ShoppingServiceTests(TestCase):
             },
             allowed_merchants=['Amazon', 'BestBuy']
         )
+
+    def setUp(self):
         self.shopping_service = ShoppingService()
 
     def test_start_shopping_task(self):
@@ -45,19 +48,185 @@ class ShoppingServiceTests(TestCase):
             amount=Decimal('150.00'),
             merchant='Amazon',
             merchant_wallet='0x1234567890abcdef1234567890abcdef12345678',
-            market_average_price=Decimal('180.00')
+            market_average_price=Decimal('170.00')
         )
         result = self.shopping_service.verify_transaction(transaction)
         self.assertTrue(result['approved'])
 
+    def test_verify_transaction_without_commit(self):
+        transaction = Transaction.objects.create(
+            agent_instance=self.agent,
+            amount=Decimal('150.00'),
+            merchant='Amazon',
+            merchant_wallet='0x1234567890abcdef1234567890abcdef12345678'
+        )
+        with self.assertNumQueries(0):
+            result = self.shopping_service.verify_transaction(transaction, commit=False)
+
+        self.assertTrue(result['approved'])
+        self.assertEqual(transaction.status, Transaction.Status.APPROVED)
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, Transaction.Status.PENDING)
+
+    def test_verify_transaction_uses_policy_snapshot(self):
+        transaction = Transaction.objects.create(
+            agent_instance=self.agent,
+            amount=Decimal('150.00'),
+            merchant='Amazon',
+            merchant_wallet='0x1234567890abcdef1234567890abcdef12345678'
+        )
+        self.assertEqual(transaction.snapshot_max_budget, Decimal('1000.00'))
+        self.assertEqual(transaction.snapshot_allowed_merchants, ['Amazon', 'BestBuy'])
+
+        # Policy changes after the fact don't affect an existing transaction
+        self.agent.allowed_merchants = []
+        self.agent.save()
+        transaction = Transaction.objects.get(pk=transaction.pk)
+        result = self.shopping_service.verify_transaction(transaction)
+        self.assertTrue(result['approved'])
+
+    def test_verify_price_reasonable_boundary(self):
+        market_price = Decimal('180.00')
+        for amount, expected in (('153.00', True), ('152.99', False),
+                                 ('207.00', True), ('207.01', False)):
+            transaction = Transaction(
+                amount=Decimal(amount),
+                market_average_price=market_price
+            )
+            self.assertEqual(
+                self.shopping_service._verify_price_reasonable(transaction),
+                expected,
+                amount
+            )
+
+    def test_verify_batch(self):
+        wallet = '0x1234567890abcdef1234567890abcdef12345678'
+        approved = Transaction.objects.create(
+            agent_instance=self.agent,
+            amount=Decimal('150.00'),
+            merchant='Amazon',
+            merchant_wallet=wallet
+        )
+        over_budget = Transaction.objects.create(
+            agent_instance=self.agent,
+            amount=Decimal('1500.00'),
+            merchant='Amazon',
+            merchant_wallet=wallet
+        )
+        bad_merchant = Transaction.objects.create(
+            agent_instance=self.agent,
+            amount=Decimal('150.00'),
+            merchant='eBay',
+            merchant_wallet=wallet
+        )
+
+        # one read, one UPDATE regardless of batch size
+        with self.assertNumQueries(2):
+            results = self.shopping_service.verify_batch(
+                [approved.id, over_budget.id, bad_merchant.id]
+            )
+
+        self.assertEqual(results, {
+            approved.id: True,
+            over_budget.id: False,
+            bad_merchant.id: False
+        })
+        approved.refresh_from_db()
+        over_budget.refresh_from_db()
+        self.assertEqual(approved.status, Transaction.Status.APPROVED)
+        self.assertEqual(over_budget.status, Transaction.Status.REJECTED)
+
+        self.assertEqual(
+            list(self.shopping_service.get_executable_transactions()),
+            [approved]
+        )
+
+    def test_verify_batch_skips_decided_transactions(self):
+        executed = Transaction.objects.create(
+            agent_instance=self.agent,
+            amount=Decimal('150.00'),
+            merchant='Amazon',
+            merchant_wallet='0x1234567890abcdef1234567890abcdef12345678',
+            status=Transaction.Status.EXECUTED
+        )
+
+        self.assertEqual(self.shopping_service.verify_batch([executed.id]), {})
+        executed.refresh_from_db()
+        self.assertEqual(executed.status, Transaction.Status.EXECUTED)
+        self.assertEqual(list(self.shopping_service.get_executable_transactions()), [])
+
+    def test_verify_batch_skips_in_flight_verifications(self):
+        verifying = Transaction.objects.create(
+            agent_instance=self.agent,
+            amount=Decimal('150.00'),
+            merchant='Amazon',
+            merchant_wallet='0x1234567890abcdef1234567890abcdef12345678',
+            status=Transaction.Status.VERIFYING
+        )
+
+        self.assertEqual(self.shopping_service.verify_batch([verifying.id]), {})
+        verifying.refresh_from_db()
+        self.assertEqual(verifying.status, Transaction.Status.VERIFYING)
+        self.assertEqual(list(self.shopping_service.get_executable_transactions()), [])
+
+    def test_execute_approved_transactions(self):
+        self.agent.bridge_wallet_address = '0x9876543210abcdef1234567890abcdef12345678'
+        self.agent.save()
+        transactions = [
+            Transaction.objects.create(
+                agent_instance=self.agent,
+                amount=Decimal('150.00'),
+                merchant='Amazon',
+                merchant_wallet='0x1234567890abcdef1234567890abcdef12345678',
+                status=Transaction.Status.APPROVED
+            )
+            for _ in range(3)
+        ]
+
+        # claim: savepoint, locked read, UPDATE, release;
+        # record: savepoint, bulk UPDATE, one score UPDATE, release
+        with self.assertNumQueries(8):
+            executed = self.shopping_service.execute_approved_transactions(
+                MockBridgeWalletService()
+            )
+
+        self.assertEqual(executed, 3)
+        self.agent.refresh_from_db()
+        self.assertEqual(self.agent.trust_score, 65)
+        hashes = set()
+        for tx in transactions:
+            tx.refresh_from_db()
+            self.assertEqual(tx.status, Transaction.Status.EXECUTED)
+            self.assertIsNotNone(tx.executed_at)
+            hashes.add(tx.transaction_hash)
+        self.assertEqual(len(hashes), 3)
+        self.assertEqual(list(self.shopping_service.get_executable_transactions()), [])
+
+    def test_execute_approved_transactions_releases_claim_on_transfer_error(self):
+        tx = Transaction.objects.create(
+            agent_instance=self.agent,
+            amount=Decimal('150.00'),
+            merchant='Amazon',
+            merchant_wallet='0x1234567890abcdef1234567890abcdef12345678',
+            status=Transaction.Status.APPROVED
+        )
+        failing_wallet = SimpleNamespace(execute_transfers=lambda transfers: 1 / 0)
+
+        with self.assertRaises(ZeroDivisionError):
+            self.shopping_service.execute_approved_transactions(failing_wallet)
+
+        tx.refresh_from_db()
+        self.assertEqual(tx.status, Transaction.Status.APPROVED)
+        self.assertIsNone(tx.executed_at)
+        self.assertEqual(list(self.shopping_service.get_executable_transactions()), [tx])
+
 class MockBridgeWalletServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_users('testuser')[0]
+
     def setUp(self):
         self.wallet_service = MockBridgeWalletService()
-        self.user = User.objects.create_user(
-            username='testuser',
-            email='test@example.com',
-            password='testpass123'
-        )
 
     def test_create_wallet(self):
         wallet_address = self.wallet_service.create_wallet(self.user)
@@ -74,11 +243,29 @@ class MockBridgeWalletServiceTests(TestCase):
             amount
         )
         self.assertTrue(tx_hash.startswith('0x'))
+        self.assertEqual(len(tx_hash), 66)
+        self.assertEqual(
+            tx_hash,
+            self.wallet_service.execute_transfer(from_wallet, to_wallet, amount)
+        )
 
 class TrustScoreServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_users('testuser')[0]
+        cls.template = AgentTemplate.objects.create(
+            name='Test Template',
+            description='Test Description',
+            capabilities={'test': True}
+        )
+        cls.agent = AgentInstance.objects.create(
+            user=cls.user,
+            template=cls.template,
+            max_budget=Decimal('1000.00'),
+            allowed_merchants=['Amazon', 'BestBuy']
+        )
+
     def setUp(self):
-        # Setup code similar to ShoppingServiceTests
-        # ... (previous setup code) ...
         self.trust_service = TrustScoreService()
 
     def test_update_score(self):
@@ -100,10 +287,48 @@ class TrustScoreServiceTests(TestCase):
         self.agent.save()
         self.trust_service.update_score(self.agent, 'FAILED_TRANSACTION')
         self.agent.refresh_from_db()
-        self.assertEqual(self.agent.trust_score, 0) 
+        self.assertEqual(self.agent.trust_score, 0)
+
+    def test_update_scores_by_count(self):
+        other = AgentInstance.objects.create(
+            user=self.user,
+            template=self.agent.template,
+            max_budget=Decimal('1000.00'),
+            allowed_merchants=['Amazon'],
+            trust_score=98
+        )
+
+        with self.assertNumQueries(1):
+            self.trust_service.update_scores_by_count(
+                {self.agent.id: 3, other.id: 2}, 'SUCCESSFUL_TRANSACTION'
+            )
+
+        self.agent.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.agent.trust_score, 65)
+        self.assertEqual(other.trust_score, 100)
+
+    def test_update_scores_from_queryset(self):
+        other = AgentInstance.objects.create(
+            user=self.user,
+            template=self.template,
+            max_budget=Decimal('1000.00'),
+            status='SHOPPING'
+        )
+        with self.assertNumQueries(1):
+            self.trust_service.update_scores(
+                AgentInstance.objects.filter(status='SHOPPING'),
+                'SUSPICIOUS_ACTIVITY'
+            )
+
+        other.refresh_from_db()
+        self.agent.refresh_from_db()
+        self.assertEqual(other.trust_score, 35)
+        self.assertEqual(self.agent.trust_score, 50)
 
 class PromptProcessingServiceTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.service = PromptProcessingService()
         self.test_prompt = "I want to buy a gaming laptop under $2000"
         self.expected_constraints = {
@@ -115,36 +340,91 @@ class PromptProcessingServiceTests(TestCase):
                 'shipping': 'standard'
             }
         }
-
-    @patch('openai.OpenAI')
-    def test_process_shopping_prompt(self, mock_openai):
-        # Configure mock
-        mock_completion = MagicMock()
-        mock_completion.choices[0].message.content = (
+        self.completion_content = (
             '{"max_price": 2000, "categories": ["electronics", "laptops", "gaming"], '
             '"preferences": {"brand": "trusted", "condition": "new", "shipping": "standard"}}'
         )
-        mock_client = MagicMock()
-        mock_client.chat.completions.create.return_value = mock_completion
-        mock_openai.return_value = mock_client
+
+    def test_tests_never_use_the_real_client(self):
+        self.assertIsInstance(self.service.client, MockOpenAIClient)
+        result = self.service.process_shopping_prompt(self.test_prompt)
+        self.assertEqual(result, MockOpenAIClient.CONSTRAINTS)
+
+    def _use_fake_client(self, create):
+        """Swap the service's OpenAI client for one whose completions.create is `create`."""
+        old_client = self.service.client
+        self.service.client = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+        )
+        self.addCleanup(setattr, self.service, 'client', old_client)
+
+    def _completion(self, content):
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+        )
+
+    def test_process_shopping_prompt(self):
+        calls = []
+
+        def create(**kwargs):
+            calls.append(kwargs)
+            return self._completion(self.completion_content)
+
+        self._use_fake_client(create)
 
         # Test the service
         result = self.service.process_shopping_prompt(self.test_prompt)
         
         self.assertEqual(result, self.expected_constraints)
-        mock_client.chat.completions.create.assert_called_once()
+        self.assertEqual(len(calls), 1)
 
     def test_process_shopping_prompt_error_handling(self):
-        with patch('openai.OpenAI') as mock_openai:
-            # Configure mock to raise an exception
-            mock_client = MagicMock()
-            mock_client.chat.completions.create.side_effect = Exception("API Error")
-            mock_openai.return_value = mock_client
+        def create(**kwargs):
+            raise Exception("API Error")
+
+        self._use_fake_client(create)
+
+        # Test error handling
+        result = self.service.process_shopping_prompt(self.test_prompt)
+        
+        # Should return default constraints on error
+        self.assertTrue('max_price' in result)
+        self.assertTrue('categories' in result)
+        self.assertTrue('preferences' in result) 
+
+    def test_process_shopping_prompt_rejects_wrong_shape(self):
+        for content in ('{"categories": ["laptops"]}', '["laptop"]', '1000'):
+            cache.clear()
+            self._use_fake_client(lambda **kwargs: self._completion(content))
 
-            # Test error handling
             result = self.service.process_shopping_prompt(self.test_prompt)
-            
-            # Should return default constraints on error
-            self.assertTrue('max_price' in result)
-            self.assertTrue('categories' in result)
-            self.assertTrue('preferences' in result) 
\ No newline at end of file
+
+            self.assertEqual(result, self.service._get_default_constraints())
+            self.assertEqual(
+                cache.get(self.service._get_cache_key(self.test_prompt)),
+                self.service._get_default_constraints()
+            )
+
+    def test_process_shopping_prompt_cached(self):
+        calls = []
+
+        def create(**kwargs):
+            calls.append(kwargs)
+            return self._completion(self.completion_content)
+
+        self._use_fake_client(create)
+
+        first = self.service.process_shopping_prompt(self.test_prompt)
+        second = self.service.process_shopping_prompt(
+            "  I want to buy a GAMING laptop,   under $2000! "
+        )
+
+        self.assertEqual(first, self.expected_constraints)
+        self.assertEqual(second, {**self.expected_constraints, '_source': 'cache'})
+        self.assertEqual(len(calls), 1)
+
+    def test_cache_key_keeps_decimal_points(self):
+        self.assertNotEqual(
+            self.service._get_cache_key("laptop under $1.5k"),
+            self.service._get_cache_key("laptop under $15k")
+        )
@@ -1,57 +1,64 @@
-from django.test import TestCase
+from django.core.cache import cache
 from django.urls import reverse
-from rest_framework.test import APIClient
+from rest_framework.test import APITestCase
 from rest_framework import status
-from django.contrib.auth.models import User
 from decimal import Decimal
-from ..models import AgentTemplate, AgentInstance, Transaction
+from ..models import (
+    AgentTemplate, AgentInstance, Transaction, PriceComparison,
+    get_template_cached, set_agent_status_cached
+)
+from ..services import TrustScoreService
+from .utils import create_users
 import json
 from unittest.mock import patch
 from django.conf import settings
 
 
-class UserRegistrationViewTests(TestCase):
-    def setUp(self):
-        self.client = APIClient()
-        self.register_url = reverse('user-registration')
-        self.user_data = {
+class UserRegistrationViewTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.register_url = reverse('core:user-registration')
+        # Fixed payloads are encoded once rather than on every request
+        cls.user_payload = json.dumps({
             'username': 'testuser',
             'email': 'test@example.com',
             'password': 'testpass123'
-        }
+        })
 
     def test_user_registration(self):
         response = self.client.post(
             self.register_url,
-            self.user_data,
-            format='json'
+            self.user_payload,
+            content_type='application/json'
         )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertIn('wallet_address', response.data)
         self.assertTrue(response.data['wallet_address'].startswith('0x'))
 
 
-class AgentSetupViewTests(TestCase):
-    def setUp(self):
-        self.client = APIClient()
-        self.user = User.objects.create_user(
-            username='testuser',
-            email='test@example.com',
-            password='testpass123'
-        )
-        self.template = AgentTemplate.objects.create(
+class AgentSetupViewTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.setup_url = reverse('core:agent-setup')
+        cls.user = create_users('testuser')[0]
+        cls.template = AgentTemplate.objects.create(
             name='Test Template',
             description='Test Description',
             capabilities={'test': True}
         )
-        self.client.force_authenticate(user=self.user)
-        self.setup_url = reverse('agent-setup')
-        self.setup_data = {
+        cls.setup_data = {
             'prompt': 'I want to buy a new laptop under $1000',
-            'template_id': self.template.id,
+            'template_id': cls.template.id,
             'bridge_wallet_address': '0x1234567890abcdef1234567890abcdef12345678'
         }
-        
+        cls.setup_payload = json.dumps(cls.setup_data)
+        cls.no_prompt_payload = json.dumps({
+            key: value for key, value in cls.setup_data.items() if key != 'prompt'
+        })
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
         # Mock response for OpenAI
         self.mock_constraints = {
             'max_price': 1000,
@@ -70,8 +77,8 @@ class AgentSetupViewTests(TestCase):
         
         response = self.client.post(
             self.setup_url,
-            self.setup_data,
-            format='json'
+            self.setup_payload,
+            content_type='application/json'
         )
         
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -84,61 +91,340 @@ class AgentSetupViewTests(TestCase):
         # Verify mock was called with correct prompt
         mock_process.assert_called_once_with(self.setup_data['prompt'])
 
+    @patch('core.services.PromptProcessingService.process_shopping_prompt')
+    def test_agent_setup_stores_constraints_without_cache_provenance(self, mock_process):
+        mock_process.return_value = {'_source': 'cache', **self.mock_constraints}
+
+        response = self.client.post(
+            self.setup_url,
+            self.setup_payload,
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        agent = AgentInstance.objects.get(pk=response.data['id'])
+        self.assertEqual(agent.constraints, self.mock_constraints)
+
     @patch('core.services.PromptProcessingService.process_shopping_prompt')
     def test_agent_setup_no_prompt(self, mock_process):
-        data = self.setup_data.copy()
-        del data['prompt']
-        
         response = self.client.post(
             self.setup_url,
-            data,
-            format='json'
+            self.no_prompt_payload,
+            content_type='application/json'
         )
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('prompt', response.data['error'])
 
+    @patch('core.services.PromptProcessingService.process_shopping_prompt')
+    def test_agent_setup_rejects_junk_prompt(self, mock_process):
+        for prompt in ('   ', '$$$ 1000 !!!', 'a' * 30, 'laptop ' * 400, 42):
+            response = self.client.post(
+                self.setup_url,
+                {**self.setup_data, 'prompt': prompt},
+                format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, prompt)
+        mock_process.assert_not_called()
 
-class TransactionVerificationViewTests(TestCase):
-    def setUp(self):
-        # Setup code similar to AgentSetupViewTests
-        # ... (previous setup code) ...
-        self.agent = AgentInstance.objects.create(
-            user=self.user,
-            template=self.template,
+    @patch('core.services.PromptProcessingService.process_shopping_prompt')
+    def test_agent_setup_allows_whitespace_runs(self, mock_process):
+        mock_process.return_value = self.mock_constraints
+        prompt = 'I want a laptop under 1000' + ' ' * 20 + '\n' * 20 + 'thanks'
+
+        response = self.client.post(
+            self.setup_url,
+            {**self.setup_data, 'prompt': prompt},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+class TransactionVerificationViewTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.verify_url = reverse('core:transaction-verify')
+        cls.user, cls.other_user = create_users('testuser', 'other')
+        cls.template = AgentTemplate.objects.create(
+            name='Test Template',
+            description='Test Description',
+            capabilities={'test': True}
+        )
+        cls.agent = AgentInstance.objects.create(
+            user=cls.user,
+            template=cls.template,
             max_budget=Decimal('1000.00'),
-            constraints=self.setup_data['constraints'],
-            allowed_merchants=self.setup_data['allowed_merchants'],
-            bridge_wallet_address=self.setup_data['bridge_wallet_address']
+            constraints={
+                'max_price': 500,
+                'categories': ['electronics'],
+                'preferences': {'brand': 'trusted'}
+            },
+            allowed_merchants=['Amazon', 'BestBuy'],
+            bridge_wallet_address='0x1234567890abcdef1234567890abcdef12345678'
         )
-        self.verify_url = reverse('transaction-verify')
-        self.transaction_data = {
-            'agent_instance': self.agent.id,
+        cls.transaction_payload = json.dumps({
+            'agent_instance': cls.agent.id,
             'amount': '150.00',
             'merchant': 'Amazon',
             'merchant_wallet': '0x1234567890abcdef1234567890abcdef12345678'
-        }
+        })
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
 
     def test_transaction_verification_success(self):
-        response = self.client.post(
-            self.verify_url,
-            self.transaction_data,
-            format='json'
-        )
+        # narrow agent read, INSERT, then the two UPDATEs in one savepoint
+        with self.assertNumQueries(6):
+            response = self.client.post(
+                self.verify_url,
+                self.transaction_payload,
+                content_type='application/json'
+            )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['status'], 'EXECUTED')
         self.assertTrue('transaction_hash' in response.data)
 
+        transaction = Transaction.objects.get(agent_instance=self.agent)
+        self.assertEqual(transaction.status, Transaction.Status.EXECUTED)
+        self.assertEqual(transaction.transaction_hash, response.data['transaction_hash'])
+
     def test_transaction_verification_unauthorized_agent(self):
-        other_user = User.objects.create_user(
-            username='other',
-            email='other@example.com',
-            password='other123'
-        )
-        self.client.force_authenticate(user=other_user)
+        self.client.force_authenticate(user=self.other_user)
         response = self.client.post(
             self.verify_url,
-            self.transaction_data,
-            format='json'
+            self.transaction_payload,
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TransactionListViewTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.list_url = reverse('core:transaction-list')
+        cls.user = create_users('testuser')[0]
+        cls.template = AgentTemplate.objects.create(
+            name='Test Template',
+            description='Test Description',
+            capabilities={'test': True}
+        )
+        cls.agent = AgentInstance.objects.create(
+            user=cls.user,
+            template=cls.template,
+            max_budget=Decimal('1000.00'),
+            allowed_merchants=['Amazon']
+        )
+        for amount in ('100.00', '200.00', '300.00'):
+            tx = Transaction.objects.create(
+                agent_instance=cls.agent,
+                amount=Decimal(amount),
+                merchant='Amazon',
+                merchant_wallet='0x1234567890abcdef1234567890abcdef12345678'
+            )
+            PriceComparison.objects.create(
+                transaction=tx,
+                merchant_name='BestBuy',
+                price=Decimal(amount) + 10,
+                url='https://example.com/item'
+            )
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def test_transaction_list_query_count(self):
+        # count + page + price comparison prefetch, independent of page size
+        with self.assertNumQueries(3):
+            response = self.client.get(self.list_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results'][0]['price_comparisons']), 1)
+
+
+class AgentListViewTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.list_url = reverse('core:agent-list')
+        cls.user = create_users('testuser')[0]
+        templates = AgentTemplate.objects.bulk_create([
+            AgentTemplate(
+                name=f'Template {i}',
+                description='Test Description',
+                capabilities={'test': True}
+            )
+            for i in range(3)
+        ])
+        AgentInstance.objects.bulk_create([
+            AgentInstance(
+                user=cls.user,
+                template=template,
+                max_budget=Decimal('1000.00'),
+                allowed_merchants=['Amazon']
+            )
+            for template in templates
+        ])
+
+    def setUp(self):
+        # bulk_create sends no post_save, and earlier test classes may have
+        # cached templates whose (rolled back) pks these ones reuse
+        get_template_cached.cache_clear()
+        self.client.force_authenticate(user=self.user)
+
+    def test_agent_list_query_count(self):
+        # warm the template cache
+        self.client.get(self.list_url)
+
+        # count + page, with the user joined in and templates cached
+        with self.assertNumQueries(2):
+            response = self.client.get(self.list_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['results'][0]['username'], 'testuser')
+        self.assertEqual(response.data['results'][0]['template_name'], 'Template 0')
+        self.assertNotIn('constraints', response.data['results'][0])
+
+    def test_agent_detail(self):
+        agent = AgentInstance.objects.filter(user=self.user).first()
+        response = self.client.get(
+            reverse('core:agent-detail', kwargs={'agent_id': agent.id})
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user']['username'], 'testuser')
+        self.assertIn('constraints', response.data)
+        self.assertIn('allowed_merchants', response.data)
+
+
+class AgentStatusViewTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other_user = create_users('testuser', 'other')
+        cls.template = AgentTemplate.objects.create(
+            name='Test Template',
+            description='Test Description',
+            capabilities={'test': True}
+        )
+        cls.agent = AgentInstance.objects.create(
+            user=cls.user,
+            template=cls.template,
+            max_budget=Decimal('1000.00'),
+            allowed_merchants=['Amazon']
+        )
+        cls.transaction = Transaction.objects.create(
+            agent_instance=cls.agent,
+            amount=Decimal('150.00'),
+            merchant='Amazon',
+            merchant_wallet='0x1234567890abcdef1234567890abcdef12345678'
+        )
+        cls.status_url = reverse('core:agent-status', kwargs={'agent_id': cls.agent.id})
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+
+    def test_agent_status(self):
+        # agent with the latest transaction annotated on
+        with self.assertNumQueries(1):
+            response = self.client.get(self.status_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'IDLE')
+        self.assertEqual(response.data['latest_transaction']['id'], self.transaction.id)
+        self.assertEqual(response.data['latest_transaction']['status'], 'PENDING')
+        self.assertEqual(response.data['latest_transaction']['amount'], '150.00')
+
+    def test_agent_status_other_users_agent(self):
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(self.status_url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_agent_status_cached_until_score_changes(self):
+        self.client.get(self.status_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.status_url)
+        self.assertEqual(response.data['trust_score'], 50)
+
+        TrustScoreService().update_score(self.agent, 'SUCCESSFUL_TRANSACTION')
+        with self.assertNumQueries(1):
+            response = self.client.get(self.status_url)
+        self.assertEqual(response.data['trust_score'], 55)
+
+    def test_agent_status_recached_before_commit_is_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            TrustScoreService().update_score(self.agent, 'SUCCESSFUL_TRANSACTION')
+            # another connection polling before the commit still sees score 50
+            set_agent_status_cached(self.agent.id, self.user.id, {'trust_score': 50})
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.status_url)
+        self.assertEqual(response.data['trust_score'], 55)
+
+    def test_agent_status_cache_checks_owner(self):
+        self.client.get(self.status_url)
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(self.status_url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_latest_transaction_survives_agent_changes(self):
+        self.client.get(self.status_url)
+        self.agent.status = 'SHOPPING'
+        self.agent.save(update_fields=['status'])
+        with self.assertNumQueries(1):
+            response = self.client.get(self.status_url)
+        self.assertEqual(response.data['status'], 'SHOPPING')
+        self.assertEqual(response.data['latest_transaction']['id'], self.transaction.id)
+
+        newer = Transaction.objects.create(
+            agent_instance=self.agent,
+            amount=Decimal('90.00'),
+            merchant='Amazon',
+            merchant_wallet='0x1234567890abcdef1234567890abcdef12345678'
+        )
+        response = self.client.get(self.status_url)
+        self.assertEqual(response.data['latest_transaction']['id'], newer.id)
+
+
+class AgentShoppingViewTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other_user = create_users('testuser', 'other')
+        cls.template = AgentTemplate.objects.create(
+            name='Test Template',
+            description='Test Description',
+            capabilities={'test': True}
+        )
+        cls.agent = AgentInstance.objects.create(
+            user=cls.user,
+            template=cls.template,
+            max_budget=Decimal('1000.00'),
+            allowed_merchants=['Amazon']
         )
+        cls.shop_url = reverse('core:agent-shopping', kwargs={'agent_id': cls.agent.id})
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def test_agent_shopping(self):
+        # claim UPDATE + agent fetch
+        with self.assertNumQueries(2):
+            response = self.client.post(self.shop_url, {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['task_id'], f'task_{self.agent.id}_{self.user.id}')
+        self.agent.refresh_from_db()
+        self.assertEqual(self.agent.status, 'SHOPPING')
+
+        response = self.client.post(self.shop_url, {}, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_agent_shopping_other_users_agent(self):
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.post(self.shop_url, {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.agent.refresh_from_db()
+        self.assertEqual(self.agent.status, 'IDLE')
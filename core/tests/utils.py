@@ -0,0 +1,23 @@
+import functools
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+TEST_PASSWORD = 'testpass123'
+
+
+@functools.lru_cache(maxsize=None)
+def _hashed_password(password):
+    return make_password(password)
+
+
+def create_users(*usernames, password=TEST_PASSWORD):
+    """
+    Insert users in one query, hashing their shared password only once.
+    bulk_create sends no pre_save/post_save signals.
+    """
+    hashed = _hashed_password(password)
+    return User.objects.bulk_create([
+        User(username=username, email=f'{username}@example.com', password=hashed)
+        for username in usernames
+    ])
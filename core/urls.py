@@ -1,10 +1,13 @@
 from django.urls import path
 from .views import (
     UserRegistrationView,
+    AgentListView,
+    AgentDetailView,
     AgentSetupView,
     AgentShoppingView,
     AgentStatusView,
     TransactionVerificationView,
+    TransactionListView,
     StandalonePromptProcessingView
 )
 
@@ -12,9 +15,12 @@ app_name = 'core'
 
 urlpatterns = [
     path('auth/register/', UserRegistrationView.as_view(), name='user-registration'),
+    path('agents/', AgentListView.as_view(), name='agent-list'),
+    path('agents/<int:agent_id>/', AgentDetailView.as_view(), name='agent-detail'),
     path('agents/setup/', AgentSetupView.as_view(), name='agent-setup'),
     path('agents/<int:agent_id>/shop/', AgentShoppingView.as_view(), name='agent-shopping'),
     path('agents/<int:agent_id>/status/', AgentStatusView.as_view(), name='agent-status'),
+    path('transactions/', TransactionListView.as_view(), name='transaction-list'),
     path('transactions/verify/', TransactionVerificationView.as_view(), name='transaction-verify'),
     path('prompt/process/', StandalonePromptProcessingView.as_view(), name='prompt-process'),
 ]
\ No newline at end of file
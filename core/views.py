@@ -1,21 +1,58 @@
-from rest_framework import status
+from rest_framework import status, generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.exceptions import ValidationError
-from django.shortcuts import get_object_or_404
-from django.db import transaction
+from django.db import DatabaseError, transaction
+from django.db.models import Prefetch
+from requests import RequestException
+import functools
 import logging
+import re
 
-from .models import AgentInstance, Transaction
+from .models import (
+    AgentInstance, Transaction, PriceComparison,
+    get_agent_status_cached, set_agent_status_cached,
+    get_latest_transaction_cached, set_latest_transaction_cached
+)
 from .serializers import (
-    UserSerializer, AgentInstanceSerializer, TransactionSerializer,
-    AgentStatusSerializer, AgentSetupSerializer
+    UserSerializer, AgentInstanceSerializer, AgentSummarySerializer,
+    TransactionSerializer, AgentSetupSerializer
 )
 from .services import ShoppingService, MockBridgeWalletService, TrustScoreService, PromptProcessingService
 
 logger = logging.getLogger(__name__)
 
+# The services keep no per-request state, so one instance of each is shared
+_shopping_service = ShoppingService()
+_wallet_service = MockBridgeWalletService()
+_trust_service = TrustScoreService()
+
+
+@functools.lru_cache(maxsize=1)
+def _prompt_service():
+    """Built on first use, so importing the views doesn't construct an OpenAI client"""
+    return PromptProcessingService()
+
+
+MAX_PROMPT_LENGTH = 2048
+# No letters at all, or one visible character hammered 20+ times
+# (runs of spaces or blank lines are fine)
+_JUNK_PROMPT = re.compile(r'^[\W\d_]*$|(\S)\1{19,}')
+
+
+def _validate_prompt(prompt):
+    """
+    Cheap checks run before a prompt can reach OpenAI.
+    Returns an error message, or None if the prompt may be processed
+    """
+    if not isinstance(prompt, str) or not prompt.strip():
+        return 'Shopping prompt is required'
+    if len(prompt) > MAX_PROMPT_LENGTH:
+        return f'Shopping prompt must be at most {MAX_PROMPT_LENGTH} characters'
+    if _JUNK_PROMPT.search(prompt):
+        return 'Shopping prompt does not describe a purchase'
+    return None
+
 
 class UserRegistrationView(APIView):
     permission_classes = [AllowAny]
@@ -26,19 +63,23 @@ class UserRegistrationView(APIView):
         Also creates a Bridge wallet for the user.
         """
         serializer = UserSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'error': 'Registration failed',
+                'detail': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            serializer.is_valid(raise_exception=True)
-            with transaction.atomic():
-                user = serializer.save()
-                # Initialize Bridge wallet
-                wallet_service = MockBridgeWalletService()
-                wallet_address = wallet_service.create_wallet(user)
+            # A single INSERT; the wallet call must not hold a DB transaction open
+            user = serializer.save()
+            # Initialize Bridge wallet
+            wallet_address = _wallet_service.create_wallet(user)
 
-                return Response({
-                    'user': serializer.data,
-                    'wallet_address': wallet_address
-                }, status=status.HTTP_201_CREATED)
-        except Exception as e:
+            return Response({
+                'user': serializer.data,
+                'wallet_address': wallet_address
+            }, status=status.HTTP_201_CREATED)
+        except (DatabaseError, RequestException) as e:
             logger.error(f"User registration failed: {str(e)}")
             return Response({
                 'error': 'Registration failed',
@@ -53,43 +94,80 @@ class AgentSetupView(APIView):
         """
         Configure a new shopping agent instance based on natural language prompt.
         """
-        try:
-            # Get the prompt from request
-            prompt = request.data.get('prompt')
-            if not prompt:
-                raise ValidationError("Shopping prompt is required")
-
-            # Process the prompt into constraints
-            processor = PromptProcessingService()
-            constraints = processor.process_shopping_prompt(prompt)
-
-            # Prepare agent data
-            data = {
-                'template_id': request.data.get('template_id', 1),  # Default template
-                'constraints': constraints,
-                'max_budget': constraints['max_price'],  # Use max_price as budget
-                'allowed_merchants': request.data.get('allowed_merchants', ['Amazon', 'BestBuy']),
-                'bridge_wallet_address': request.data.get('bridge_wallet_address')
-            }
-
-            logger.info(f"Creating agent with processed data: {data}")
+        # Get the prompt from request
+        prompt = request.data.get('prompt')
+        error = _validate_prompt(prompt)
+        if error:
+            return Response({
+                'error': error
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-            serializer = AgentInstanceSerializer(data=data)
-            if serializer.is_valid():
-                agent = serializer.save(user=request.user)
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-            else:
-                logger.error(f"Serializer errors: {serializer.errors}")
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # Process the prompt into constraints; OpenAI failures already fall
+        # back to the default constraints inside the service
+        constraints = _prompt_service().process_shopping_prompt(prompt)
+        if constraints.get('_source') == 'cache':
+            # Provenance is for the prompt endpoint; the stored constraints
+            # must not depend on whether the prompt was cached
+            constraints = {key: value for key, value in constraints.items() if key != '_source'}
+
+        # Prepare agent data
+        data = {
+            'template_id': request.data.get('template_id', 1),  # Default template
+            'constraints': constraints,
+            'max_budget': constraints['max_price'],  # Use max_price as budget
+            'allowed_merchants': request.data.get('allowed_merchants', ['Amazon', 'BestBuy']),
+            'bridge_wallet_address': request.data.get('bridge_wallet_address')
+        }
+
+        logger.info(f"Creating agent with processed data: {data}")
+
+        serializer = AgentInstanceSerializer(data=data)
+        if not serializer.is_valid():
+            logger.error(f"Serializer errors: {serializer.errors}")
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        except Exception as e:
-            logger.error(f"Agent setup failed: {str(e)}", exc_info=True)
+        try:
+            serializer.save(user=request.user)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        except DatabaseError as e:
+            logger.error(f"Agent setup failed: {str(e)}")
             return Response({
                 'error': 'Setup failed',
                 'detail': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
+class AgentListView(generics.ListAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = AgentSummarySerializer
+
+    def get_queryset(self):
+        """
+        List the requesting user's agents.
+        Only the summary columns are selected; the JSON constraint columns are
+        left to the detail view. Templates come from the in-process cache.
+        """
+        return AgentInstance.objects.filter(
+            user=self.request.user
+        ).select_related('user').only(
+            'id', 'status', 'trust_score', 'max_budget', 'template', 'user__username'
+        ).order_by('id')
+
+
+class AgentDetailView(generics.RetrieveAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = AgentInstanceSerializer
+    lookup_url_kwarg = 'agent_id'
+
+    def get_queryset(self):
+        """
+        Retrieve one of the requesting user's agents with all fields.
+        """
+        return AgentInstance.objects.filter(
+            user=self.request.user
+        ).select_related('user')
+
+
 class AgentShoppingView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -98,20 +176,19 @@ class AgentShoppingView(APIView):
         Start a shopping task for the specified agent.
         Initiates price comparison and merchant verification.
         """
-        agent = get_object_or_404(
-            AgentInstance,
-            id=agent_id,
-            user=request.user
-        )
-
-        if agent.status != 'IDLE':
+        if not _shopping_service.claim_idle_agent(agent_id, request.user.id):
+            # Only the failure path pays for telling the two cases apart
+            if AgentInstance.objects.filter(id=agent_id, user_id=request.user.id).exists():
+                return Response({
+                    'error': 'Agent is already processing a task'
+                }, status=status.HTTP_400_BAD_REQUEST)
             return Response({
-                'error': 'Agent is already processing a task'
-            }, status=status.HTTP_400_BAD_REQUEST)
+                'error': 'Agent not found'
+            }, status=status.HTTP_404_NOT_FOUND)
 
         try:
-            shopping_service = ShoppingService()
-            task_id = shopping_service.start_shopping_task(
+            agent = AgentInstance.objects.only('id', 'status', 'user_id').get(pk=agent_id)
+            task_id = _shopping_service.start_shopping_task(
                 agent,
                 request.data.get('search_criteria', {})
             )
@@ -121,7 +198,7 @@ class AgentShoppingView(APIView):
                 'status': 'SHOPPING'
             }, status=status.HTTP_202_ACCEPTED)
 
-        except Exception as e:
+        except DatabaseError as e:
             logger.error(f"Shopping task failed: {str(e)}")
             return Response({
                 'error': 'Shopping task failed',
@@ -129,6 +206,17 @@ class AgentShoppingView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _latest_transaction_payload(tx_id, tx_status, amount, merchant, created_at):
+    return {
+        'id': tx_id,
+        'status': Transaction.Status(tx_status).name,
+        # Annotated decimals aren't quantized on every backend
+        'amount': f'{amount:.2f}',
+        'merchant': merchant,
+        'created_at': created_at
+    }
+
+
 class AgentStatusView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -137,36 +225,44 @@ class AgentStatusView(APIView):
         Get the current status of an agent instance.
         """
         try:
-            agent = get_object_or_404(
-                AgentInstance.objects.select_related('user', 'template'),
-                id=agent_id,
-                user=request.user
-            )
-
-            # Get the latest transaction if it exists
-            latest_transaction = Transaction.objects.filter(
-                agent_instance=agent
-            ).order_by('-created_at').first()
+            cached = get_agent_status_cached(agent_id)
+            if cached is not None and cached['user_id'] == request.user.id:
+                return Response(cached['payload'])
+
+            # Kept until the agent's next transaction write, so a hit leaves
+            # only the agent's own columns to read
+            latest_transaction = get_latest_transaction_cached(agent_id)
+            if latest_transaction is not None:
+                agents = AgentInstance.objects.only('id', 'status', 'trust_score')
+            else:
+                agents = AgentInstance.objects.with_status_payload()
+            agent = agents.filter(id=agent_id, user_id=request.user.id).first()
+            if agent is None:
+                return Response({
+                    'error': 'Agent not found'
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            if latest_transaction is None and agent.latest_tx_id is not None:
+                latest_transaction = _latest_transaction_payload(
+                    agent.latest_tx_id,
+                    agent.latest_tx_status,
+                    agent.latest_tx_amount,
+                    agent.latest_tx_merchant,
+                    agent.latest_tx_created_at
+                )
+                set_latest_transaction_cached(agent.id, latest_transaction)
 
             response_data = {
                 'status': agent.status,
                 'trust_score': agent.trust_score,
-                'latest_transaction': None
+                'latest_transaction': latest_transaction
             }
 
-            if latest_transaction:
-                response_data['latest_transaction'] = {
-                    'id': latest_transaction.id,
-                    'status': latest_transaction.status,
-                    'amount': str(latest_transaction.amount),
-                    'merchant': latest_transaction.merchant,
-                    'created_at': latest_transaction.created_at
-                }
-
+            set_agent_status_cached(agent.id, request.user.id, response_data)
             return Response(response_data)
 
-        except Exception as e:
-            logger.error(f"Error getting agent status: {str(e)}", exc_info=True)
+        except DatabaseError as e:
+            logger.error(f"Error getting agent status: {str(e)}")
             return Response({
                 'error': 'Failed to get agent status',
                 'detail': str(e)
@@ -182,55 +278,62 @@ class TransactionVerificationView(APIView):
         Requires transaction details and performs safety checks.
         """
         serializer = TransactionSerializer(data=request.data)
-        try:
-            serializer.is_valid(raise_exception=True)
+        if not serializer.is_valid():
+            return Response({
+                'error': 'Verification failed',
+                'detail': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Verify agent ownership
-            agent = serializer.validated_data['agent_instance']
-            if agent.user != request.user:
-                raise ValidationError("Not authorized for this agent")
+        # Verify agent ownership
+        agent = serializer.validated_data['agent_instance']
+        if agent.user_id != request.user.id:
+            return Response({
+                'error': 'Not authorized for this agent'
+            }, status=status.HTTP_403_FORBIDDEN)
 
-            with transaction.atomic():
-                # Create transaction record
-                transaction_obj = serializer.save(status='VERIFYING')
+        try:
+            # Create transaction record; committed on its own so the
+            # verification and transfer below don't run inside a transaction
+            transaction_obj = serializer.save(status=Transaction.Status.VERIFYING)
 
-                # Perform verification
-                shopping_service = ShoppingService()
-                trust_service = TrustScoreService()
+            # Perform verification; the outcome is written once, below
+            verification_result = _shopping_service.verify_transaction(
+                transaction_obj, commit=False
+            )
 
-                verification_result = shopping_service.verify_transaction(
-                    transaction_obj
+            if verification_result['approved']:
+                # Execute USDC transfer, keyed by this transaction row: executing
+                # the same row twice yields the same hash and trips the unique
+                # constraint. A retried HTTP request creates a new row, so it
+                # is NOT deduplicated here
+                tx_hash = _wallet_service.execute_transfer(
+                    from_wallet=agent.bridge_wallet_address,
+                    to_wallet=transaction_obj.merchant_wallet,
+                    amount=transaction_obj.amount,
+                    reference=transaction_obj.pk
                 )
 
-                if verification_result['approved']:
-                    # Execute USDC transfer
-                    wallet_service = MockBridgeWalletService()
-                    tx_hash = wallet_service.execute_transfer(
-                        from_wallet=agent.bridge_wallet_address,
-                        to_wallet=transaction_obj.merchant_wallet,
-                        amount=transaction_obj.amount
-                    )
-
-                    # Update transaction and trust score
-                    transaction_obj.status = 'EXECUTED'
+                # Update transaction and trust score together
+                with transaction.atomic():
+                    transaction_obj.status = Transaction.Status.EXECUTED
                     transaction_obj.transaction_hash = tx_hash
-                    transaction_obj.save()
-
-                    trust_service.update_score(agent, 'SUCCESSFUL_TRANSACTION')
-
-                    return Response({
-                        'status': 'EXECUTED',
-                        'transaction_hash': tx_hash
-                    })
-                else:
-                    transaction_obj.status = 'REJECTED'
-                    transaction_obj.save()
-                    return Response({
-                        'status': 'REJECTED',
-                        'reason': verification_result['reason']
-                    }, status=status.HTTP_400_BAD_REQUEST)
-
-        except Exception as e:
+                    transaction_obj.save(update_fields=['status', 'transaction_hash'])
+
+                    _trust_service.update_score(agent, 'SUCCESSFUL_TRANSACTION')
+
+                return Response({
+                    'status': 'EXECUTED',
+                    'transaction_hash': tx_hash
+                })
+            else:
+                transaction_obj.status = Transaction.Status.REJECTED
+                transaction_obj.save(update_fields=['status'])
+                return Response({
+                    'status': 'REJECTED',
+                    'reason': verification_result['reason']
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        except (DatabaseError, RequestException) as e:
             logger.error(f"Transaction verification failed: {str(e)}")
             return Response({
                 'error': 'Verification failed',
@@ -238,6 +341,27 @@ class TransactionVerificationView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class TransactionListView(generics.ListAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = TransactionSerializer
+
+    def get_queryset(self):
+        """
+        List the requesting user's transactions, newest first.
+        Price comparisons are prefetched so a page costs a fixed number of queries.
+        """
+        return Transaction.objects.filter(
+            agent_instance__user=self.request.user
+        ).prefetch_related(
+            Prefetch(
+                'price_comparisons',
+                queryset=PriceComparison.objects.only(
+                    'merchant_name', 'price', 'url', 'timestamp', 'transaction_id'
+                )
+            )
+        ).order_by('-created_at')
+
+
 class StandalonePromptProcessingView(APIView):
     """Standalone endpoint for processing shopping prompts without authentication."""
     permission_classes = [AllowAny]
@@ -247,24 +371,17 @@ class StandalonePromptProcessingView(APIView):
         Convert natural language shopping prompt into structured constraints.
         No authentication or user context required.
         """
-        try:
-            prompt = request.data.get('prompt')
-            if not prompt:
-                return Response({
-                    'error': 'Shopping prompt is required'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            processor = PromptProcessingService()
-            constraints = processor.process_shopping_prompt(prompt)
-
+        prompt = request.data.get('prompt')
+        error = _validate_prompt(prompt)
+        if error:
             return Response({
-                'constraints': constraints,
-                'source': constraints.get('_source', 'openai')
-            }, status=status.HTTP_200_OK)
+                'error': error
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-        except Exception as e:
-            logger.error(f"Standalone prompt processing failed: {str(e)}")
-            return Response({
-                'error': 'Processing failed',
-                'detail': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Never raises for OpenAI failures; those come back as default constraints
+        constraints = _prompt_service().process_shopping_prompt(prompt)
+
+        return Response({
+            'constraints': constraints,
+            'source': constraints.get('_source', 'openai')
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,49 @@
+import json
+import os
+
+import pytest
+from filelock import FileLock
+
+from .test_api_endpoints import APITester, TEST_PASSWORD, unique_username
+
+
+@pytest.fixture(scope='session')
+def api_tester():
+    """One tester (and connection pool) per worker, pointed at TRUSTY_API_URL."""
+    tester = APITester(os.environ.get('TRUSTY_API_URL', 'http://localhost:8000'))
+    yield tester
+    tester.close()
+
+
+def _register(tester):
+    username = unique_username()
+    assert tester.test_registration(username, TEST_PASSWORD), "registration failed"
+    assert tester.test_token_obtain(username, TEST_PASSWORD), "token obtain failed"
+    return tester.token
+
+
+@pytest.fixture(scope='session')
+def auth_token(api_tester, tmp_path_factory):
+    """
+    Access token for a freshly registered user, stored on the tester.
+    Under xdist the first worker registers and the others reuse its token
+    from a file in the run's shared temp dir
+    """
+    if 'PYTEST_XDIST_WORKER' not in os.environ:
+        return _register(api_tester)
+
+    shared_dir = tmp_path_factory.getbasetemp().parent
+    token_file = shared_dir / 'token.json'
+    with FileLock(str(shared_dir / 'auth.lock')):
+        if token_file.is_file():
+            api_tester.set_token(json.loads(token_file.read_text())['access'])
+        else:
+            token_file.write_text(json.dumps({'access': _register(api_tester)}))
+    return api_tester.token
+
+
+@pytest.fixture(scope='session')
+def agent_id(api_tester, auth_token):
+    """Sets up an agent for the registered user; each worker gets its own."""
+    assert api_tester.test_agent_setup(), "agent setup failed"
+    return api_tester.agent_id
@@ -1,12 +1,19 @@
 import requests
-import json
-from typing import Dict, Any, List, Tuple
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Tuple
 import logging
-from .utils import setup_logging
+import os
+import time
+from .utils import LazyJSON, build_session, json_loads, setup_logging
 
 logger = setup_logging()
 
+TEST_PASSWORD = "TestPass123!"
+
+def unique_username() -> str:
+    """A username no other run or parallel worker can have registered."""
+    return f"testuser_{time.time_ns()}_{os.getpid()}"
+
 class APITester:
     """Test suite for Trusty API endpoints."""
     
@@ -14,39 +21,45 @@ class APITester:
         self.base_url = base_url.rstrip('/')
         self.token = None
         self.agent_id = None
-        self.headers = {
-            'Content-Type': 'application/json'
-        }
+        # Keep-alive connections reused by every request this tester makes;
+        # it also carries the default headers, so requests don't build their own
+        self._session = build_session()
+        self._session.headers['Content-Type'] = 'application/json'
+    
+    def close(self) -> None:
+        """Release the pooled connections."""
+        self._session.close()
     
-    def _update_auth_header(self) -> None:
-        """Update authorization header with token if available."""
-        if self.token:
-            self.headers['Authorization'] = f'Bearer {self.token}'
+    def set_token(self, token: str) -> None:
+        """Authenticate every later request with `token`."""
+        self.token = token
+        self._session.headers['Authorization'] = f'Bearer {token}'
     
     def _make_request(self, method: str, endpoint: str, data: Dict[str, Any] = None) -> Dict[str, Any]:
         """Make HTTP request to API endpoint with enhanced error logging."""
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        self._update_auth_header()
         
-        logger.info(f"\nTesting {method} {endpoint}")
-        logger.info(f"Request Data: {json.dumps(data, indent=2) if data else 'None'}")
+        logger.info("\nTesting %s %s", method, endpoint)
+        logger.info("Request Data: %s", LazyJSON(data) if data else 'None')
         
         try:
             if method.upper() == 'GET':
-                response = requests.get(url, headers=self.headers)
+                response = self._session.get(url)
             else:
-                response = requests.post(url, headers=self.headers, json=data)
+                response = self._session.post(url, json=data)
             
-            logger.info(f"Status Code: {response.status_code}")
+            logger.info("Status Code: %s", response.status_code)
             
             try:
-                response_data = response.json()
-                logger.info(f"Response: {json.dumps(response_data, indent=2)}")
+                # One parse of the raw body, one (lazy) dump for every log line
+                response_data = json_loads(response.content) if response.content else {}
+                body = LazyJSON(response_data)
+                logger.info("Response: %s", body)
                 
                 # Enhanced error logging
                 if response.status_code >= 400:
                     logger.error(f"Request failed with status {response.status_code}")
-                    logger.error(f"Error details: {json.dumps(response_data, indent=2)}")
+                    logger.error("Error details: %s", body)
                     if 'detail' in response_data:
                         logger.error(f"Error message: {response_data['detail']}")
                 
@@ -65,30 +78,35 @@ class APITester:
 
     def run_tests(self) -> List[Tuple[str, bool]]:
         """Run all API tests and return results."""
-        timestamp = int(datetime.now().timestamp())
-        username = f"testuser_{timestamp}"
-        password = "TestPass123!"
+        username = unique_username()
+        password = TEST_PASSWORD
         
-        tests = [
+        setup_tests = [
             ("Registration", lambda: self.test_registration(username, password)),
             ("Token Obtain", lambda: self.test_token_obtain(username, password)),
-            ("Agent Setup", lambda: self.test_agent_setup()),
+            ("Agent Setup", lambda: self.test_agent_setup())
+        ]
+        # Each of these only needs the token and agent from the setup tests
+        independent_tests = [
             ("Agent Shopping", lambda: self.test_agent_shopping()),
             ("Agent Status", lambda: self.test_agent_status()),
             ("Transaction Verification", lambda: self.test_transaction_verification())
         ]
         
-        results = []
-        for test_name, test_func in tests:
-            try:
-                success = test_func()
-                results.append((test_name, success))
-            except Exception as e:
-                logger.error(f"Error in {test_name}: {str(e)}")
-                results.append((test_name, False))
+        results = [self._run_test(name, func) for name, func in setup_tests]
+        with ThreadPoolExecutor(max_workers=len(independent_tests)) as executor:
+            results.extend(executor.map(lambda test: self._run_test(*test), independent_tests))
         
         return results
 
+    def _run_test(self, test_name: str, test_func: Callable[[], bool]) -> Tuple[str, bool]:
+        """Run one test, reporting an exception as a failure."""
+        try:
+            return (test_name, test_func())
+        except Exception as e:
+            logger.error(f"Error in {test_name}: {str(e)}")
+            return (test_name, False)
+
     def test_registration(self, username: str, password: str) -> bool:
         """Test user registration endpoint."""
         logger.info("\n=== Testing User Registration ===")
@@ -111,7 +129,7 @@ class APITester:
         
         response = self._make_request('POST', 'api/auth/token/', data)
         if 'access' in response:
-            self.token = response['access']
+            self.set_token(response['access'])
             return True
         return False
 
@@ -155,12 +173,12 @@ class APITester:
             
             if not validation:
                 logger.error("Missing required constraints")
-                logger.error(f"Full response: {json.dumps(response, indent=2)}")
+                logger.error("Full response: %s", LazyJSON(response, pretty=True))
                 return False
                 
             return True
             
-        logger.error(f"Unexpected response format: {json.dumps(response, indent=2)}")
+        logger.error("Unexpected response format: %s", LazyJSON(response, pretty=True))
         return False
 
     def test_agent_shopping(self) -> bool:
@@ -207,10 +225,31 @@ class APITester:
         response = self._make_request('POST', 'api/transactions/verify/', data)
         return 'status' in response
 
+# pytest entry points; the setup steps are session fixtures in conftest.py,
+# so the tests below only depend on an access token and an agent
+
+def test_auth_token(auth_token):
+    assert auth_token
+
+def test_agent_setup(agent_id):
+    assert agent_id
+
+def test_agent_shopping(api_tester, agent_id):
+    assert api_tester.test_agent_shopping()
+
+def test_agent_status(api_tester, agent_id):
+    assert api_tester.test_agent_status()
+
+def test_transaction_verification(api_tester, agent_id):
+    assert api_tester.test_transaction_verification()
+
 def main():
     """Main entry point for the test suite."""
     tester = APITester()
-    results = tester.run_tests()
+    try:
+        results = tester.run_tests()
+    finally:
+        tester.close()
     
     # Print summary
     logger.info("\n=== Test Summary ===")
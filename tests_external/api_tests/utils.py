@@ -1,14 +1,25 @@
+import json
 import logging
 import sys
-from typing import Optional
+from typing import Any, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib parser is only slower
+    orjson = None
 
 def setup_logging(level: Optional[str] = "INFO") -> logging.Logger:
     """Setup logging configuration for the test suite."""
     logger = logging.getLogger('api_tests')
     logger.setLevel(getattr(logging, level))
     
-    # Remove existing handlers
-    logger.handlers = []
+    # Every test module calls this on import; attach the handler only once
+    if logger.handlers:
+        return logger
     
     # Create console handler
     handler = logging.StreamHandler(sys.stdout)
@@ -21,4 +32,53 @@ def setup_logging(level: Optional[str] = "INFO") -> logging.Logger:
     # Add handler to logger
     logger.addHandler(handler)
     
-    return logger 
\ No newline at end of file
+    return logger 
+
+def build_session(pool_size: int = 32) -> requests.Session:
+    """
+    Session whose keep-alive pool is large enough that concurrent tests never
+    discard connections. Idempotent requests are retried on transient 5xx;
+    urllib3 never replays POSTs.
+    """
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def json_loads(body: bytes) -> Any:
+    """Parse a raw response body, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+def json_dumps(data: Any, pretty: bool = False) -> str:
+    """Serialize `data`, with orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else None).decode()
+        except TypeError:
+            pass  # e.g. non-str keys; fall back to the stdlib
+    return json.dumps(data, indent=2 if pretty else None)
+
+class LazyJSON:
+    """
+    Serializes `data` only if a log record actually formats it, and at most once.
+    Compact by default; pass pretty=True where the output is meant to be read.
+    """
+
+    __slots__ = ('data', 'pretty', '_text')
+
+    def __init__(self, data, pretty: bool = False):
+        self.data = data
+        self.pretty = pretty
+        self._text = None
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = json_dumps(self.data, self.pretty)
+        return self._text
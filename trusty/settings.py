@@ -108,6 +108,11 @@ DATABASES = {
     'default': env.db('DATABASE_URL')
 }
 
+# Cache (e.g. CACHE_URL=redis://localhost:6379/0 in production)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://')
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -235,18 +240,40 @@ AGENT_SETTINGS = {
     'ALLOWED_MERCHANTS': ['Amazon', 'BestBuy', 'Walmart'],  # Default allowed merchants
 }
 
-# Add test settings if running tests
-if 'test' in sys.argv or 'pytest' in sys.argv[0]:
+# Add test settings if running tests (xdist workers run with argv == ['-c'])
+TESTING = 'test' in sys.argv or 'pytest' in sys.modules
+if TESTING:
     DATABASES['default'] = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'test_db.sqlite3',
+        'NAME': ':memory:',
+        # Build the test schema straight from the models instead of replaying migrations
+        'TEST': {'MIGRATE': False},
     }
     EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+    # PBKDF2 is deliberately slow; test credentials don't need it
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
     SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'] = timedelta(days=1)
+    # Nothing under test uses channels; TRUSTY_TEST_CHANNELS=1 opts back in
+    if not env.bool('TRUSTY_TEST_CHANNELS', default=False):
+        INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'channels']
+        del CHANNEL_LAYERS
 
 # Add after BRIDGE_API settings
+# Opt-in canned OpenAI responses outside tests too, e.g. for a runserver
+# that tests_external runs against
+MOCK_OPENAI = env.bool('MOCK_OPENAI', default=False)
+
 OPENAI_SETTINGS = {
-    'API_KEY': env('OPENAI_API_KEY'),
+    # Required unless nothing will ever call OpenAI
+    'API_KEY': env('OPENAI_API_KEY', default='') if TESTING or MOCK_OPENAI else env('OPENAI_API_KEY'),
     'MODEL': env('OPENAI_MODEL', default='gpt-4'),
+    # Bounds how long a request worker can be held by a slow OpenAI call
+    # (the SDK default is 600s with 2 retries); failures fall back to defaults
+    'TIMEOUT': env.float('OPENAI_TIMEOUT', default=10.0),
+    'MAX_RETRIES': env.int('OPENAI_MAX_RETRIES', default=1),
     'MOCK_IN_TESTS': env.bool('MOCK_OPENAI_IN_TESTS', default=True),
-}
\ No newline at end of file
+    'MOCK': MOCK_OPENAI,
+}
+if TESTING:
+    # No test may reach the network for an LLM call, whatever the env says
+    OPENAI_SETTINGS['MOCK_IN_TESTS'] = True
\ No newline at end of file